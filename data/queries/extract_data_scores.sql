@@ -0,0 +1,98 @@
+-- Extract the rows of extract_data.sql with the normalized DMS score and its
+-- per-gene JSE and per-position mean computed by window functions, in place of
+-- the raw dms_score, wt_score and non_score (see add_score_summaries)
+WITH scores AS (
+    SELECT
+        g.id AS gene_id,
+        m.id AS mutation_id,
+        m.position,
+        m.wt_residue,
+        m.variant_residue,
+        m.eve_score,
+        m.eve_class_75_set,
+        g.assay_type,
+        m.edit_distance,
+        m.alphamissense_pathogenicity,
+        m.alphafold_conf_type,
+        mt.type AS mutation_type,
+        -- NaN and a zero score range become NULL, which aggregates skip
+        NULLIF(
+            (dms.score - dr.synonymous_from_method)
+            / NULLIF(dr.synonymous_from_method - dr.nonsense_from_method, 0) + 1,
+            'NaN'
+        ) AS normalized_dms_score
+    FROM
+        mutation m
+    JOIN
+        dms
+        ON dms.mutation_id = m.id
+    JOIN
+        gene_urn g
+        ON m.gene_urn_id = g.id
+    JOIN
+        assay a
+        ON g.assay_type = a.id
+    JOIN
+        dms_range dr
+        ON g.id = dr.gene_urn_id
+    JOIN
+        mutation_type mt
+        ON m.mutation_type_id = mt.id
+    WHERE
+        dms.score IS NOT NULL
+        AND EXISTS (
+            SELECT 1
+            FROM substitution_matrix sm
+            WHERE sm.amino_acid_x = m.wt_residue AND sm.amino_acid_y = m.variant_residue
+        )
+        AND m.eve_score != 'NaN'
+        AND dr.synonymous_from_method IS NOT NULL
+        AND dr.nonsense_from_method IS NOT NULL
+        AND g.id IN :gene_ids
+),
+gene_stats AS (
+    SELECT
+        s.*,
+        COUNT(*) OVER gene AS gene_count,
+        AVG(s.normalized_dms_score) OVER gene AS gene_mean,
+        VAR_SAMP(s.normalized_dms_score) OVER gene AS gene_var,
+        VAR_POP(s.normalized_dms_score) OVER gene
+            * COUNT(s.normalized_dms_score) OVER gene AS gene_ss,
+        AVG(s.normalized_dms_score) OVER (
+            PARTITION BY s.gene_id, s.position
+        ) AS mean_normalized_dms
+    FROM
+        scores s
+    WINDOW
+        gene AS (PARTITION BY s.gene_id)
+)
+SELECT
+    gs.gene_id,
+    gs.mutation_id,
+    gs.position,
+    gs.wt_residue,
+    gs.variant_residue,
+    gs.eve_score,
+    gs.eve_class_75_set,
+    gs.assay_type,
+    gs.edit_distance,
+    gs.alphamissense_pathogenicity,
+    gs.alphafold_conf_type,
+    gs.mutation_type,
+    gs.normalized_dms_score,
+    -- James-Stein shrinkage towards the gene mean, as in compute_group_statistics
+    CASE
+        WHEN gs.gene_var = 0 OR gs.gene_count <= 2 THEN gs.gene_mean
+        ELSE gs.gene_mean + GREATEST(
+            1 - (gs.gene_count - 2) * gs.gene_var / NULLIF(gs.gene_ss, 0), 0
+        ) * (gs.normalized_dms_score - gs.gene_mean)
+    END AS jse_normalized_dms,
+    gs.mean_normalized_dms,
+    e2.embedding AS embedding_variant
+FROM
+    gene_stats gs
+LEFT JOIN
+    esm1v_embeddings e2
+    ON e2.mutation_id = gs.mutation_id AND e2.embedding_type = 'Variant'
+ORDER BY
+    gs.gene_id, gs.mutation_id;
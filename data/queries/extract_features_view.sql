@@ -0,0 +1,29 @@
+-- Extract DMS scores and related features from the mutation_features view
+-- (db/schema/migrations/003_extraction_indexes.sql); same rows and columns as
+-- extract_data.sql
+SELECT
+    f.gene_id,
+    f.mutation_id,
+    f.position,
+    f.wt_residue,
+    f.variant_residue,
+    f.eve_score,
+    f.eve_class_75_set,
+    f.dms_score,
+    f.assay_type,
+    f.wt_score,
+    f.non_score,
+    f.edit_distance,
+    f.alphamissense_pathogenicity,
+    f.alphafold_conf_type,
+    f.mutation_type,
+    e2.embedding AS embedding_variant
+FROM
+    mutation_features f
+LEFT JOIN
+    esm1v_embeddings e2
+    ON e2.mutation_id = f.mutation_id AND e2.embedding_type = 'Variant'
+WHERE
+    f.gene_id IN :gene_ids
+ORDER BY
+    f.gene_id, f.mutation_id;
@@ -0,0 +1,73 @@
+-- Extract the rows of extract_features_view.sql with the normalized DMS score and
+-- its per-gene JSE and per-position mean computed by window functions, in place of
+-- the raw dms_score, wt_score and non_score (see add_score_summaries)
+WITH scores AS (
+    SELECT
+        f.gene_id,
+        f.mutation_id,
+        f.position,
+        f.wt_residue,
+        f.variant_residue,
+        f.eve_score,
+        f.eve_class_75_set,
+        f.assay_type,
+        f.edit_distance,
+        f.alphamissense_pathogenicity,
+        f.alphafold_conf_type,
+        f.mutation_type,
+        -- NaN and a zero score range become NULL, which aggregates skip
+        NULLIF(
+            (f.dms_score - f.wt_score) / NULLIF(f.wt_score - f.non_score, 0) + 1,
+            'NaN'
+        ) AS normalized_dms_score
+    FROM
+        mutation_features f
+    WHERE
+        f.gene_id IN :gene_ids
+),
+gene_stats AS (
+    SELECT
+        s.*,
+        COUNT(*) OVER gene AS gene_count,
+        AVG(s.normalized_dms_score) OVER gene AS gene_mean,
+        VAR_SAMP(s.normalized_dms_score) OVER gene AS gene_var,
+        VAR_POP(s.normalized_dms_score) OVER gene
+            * COUNT(s.normalized_dms_score) OVER gene AS gene_ss,
+        AVG(s.normalized_dms_score) OVER (
+            PARTITION BY s.gene_id, s.position
+        ) AS mean_normalized_dms
+    FROM
+        scores s
+    WINDOW
+        gene AS (PARTITION BY s.gene_id)
+)
+SELECT
+    gs.gene_id,
+    gs.mutation_id,
+    gs.position,
+    gs.wt_residue,
+    gs.variant_residue,
+    gs.eve_score,
+    gs.eve_class_75_set,
+    gs.assay_type,
+    gs.edit_distance,
+    gs.alphamissense_pathogenicity,
+    gs.alphafold_conf_type,
+    gs.mutation_type,
+    gs.normalized_dms_score,
+    -- James-Stein shrinkage towards the gene mean, as in compute_group_statistics
+    CASE
+        WHEN gs.gene_var = 0 OR gs.gene_count <= 2 THEN gs.gene_mean
+        ELSE gs.gene_mean + GREATEST(
+            1 - (gs.gene_count - 2) * gs.gene_var / NULLIF(gs.gene_ss, 0), 0
+        ) * (gs.normalized_dms_score - gs.gene_mean)
+    END AS jse_normalized_dms,
+    gs.mean_normalized_dms,
+    e2.embedding AS embedding_variant
+FROM
+    gene_stats gs
+LEFT JOIN
+    esm1v_embeddings e2
+    ON e2.mutation_id = gs.mutation_id AND e2.embedding_type = 'Variant'
+ORDER BY
+    gs.gene_id, gs.mutation_id;
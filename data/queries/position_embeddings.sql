@@ -0,0 +1,11 @@
+-- Wild-type ESM-1v embeddings, stored once per (gene, position)
+SELECT
+    pe.gene_urn_id AS gene_id,
+    pe.position,
+    pe.embedding AS embedding_wt
+FROM
+    esm1v_position_embeddings pe
+WHERE
+    pe.gene_urn_id IN :gene_ids
+ORDER BY
+    pe.gene_urn_id, pe.position;
@@ -0,0 +1,69 @@
+-- Substitution scores and amino acid properties for every residue pair
+SELECT
+    sm.amino_acid_x AS wt_residue,
+    sm.amino_acid_y AS variant_residue,
+    sm.blosum62,
+    sm.grantham,
+    sm.pam70,
+    sm.rao,
+    sm.risler,
+    sm.str,
+    sm.benner22,
+    sm.benner6,
+    sm.benner74,
+    sm.blastp,
+    sm.blosum45,
+    sm.blosum50,
+    sm.blosum80,
+    sm.blosum90,
+    sm.dayhoff,
+    sm.feng,
+    sm.genetic,
+    sm.gonnet1992,
+    sm.johnson,
+    sm.jones,
+    sm.levin,
+    sm.mclachlan,
+    sm.mdm78,
+    sm.pam250,
+    sm.pam30,
+    aa_wt.chemical AS wt_chemical,
+    aa_variant.chemical AS variant_chemical,
+    aa_wt.charge AS wt_charge,
+    aa_variant.charge AS variant_charge,
+    aa_wt.hydrophobic AS wt_hydrophobic,
+    aa_variant.hydrophobic AS variant_hydrophobic,
+    aa_wt.stabilizing_interaction AS wt_stabilizing_interaction,
+    aa_variant.stabilizing_interaction AS variant_stabilizing_interaction,
+    aa_wt.volume AS wt_volume,
+    aa_variant.volume AS variant_volume,
+    aa_wt.h_bond_donor AS wt_h_bond_donor,
+    aa_variant.h_bond_donor AS variant_h_bond_donor,
+    aa_wt.h_bond_acceptor AS wt_h_bond_acceptor,
+    aa_variant.h_bond_acceptor AS variant_h_bond_acceptor,
+    aa_wt.solvent_accessible AS wt_solvent_accessible,
+    aa_variant.solvent_accessible AS variant_solvent_accessible,
+    aa_wt.redox_reactivity AS wt_redox_reactivity,
+    aa_variant.redox_reactivity AS variant_redox_reactivity,
+    aa_wt.amphipathic AS wt_amphipathic,
+    aa_variant.amphipathic AS variant_amphipathic,
+    aa_wt.polar AS wt_polar,
+    aa_variant.polar AS variant_polar,
+    aa_wt.molecular_weight_da AS wt_molecular_weight_da,
+    aa_variant.molecular_weight_da AS variant_molecular_weight_da,
+    aa_wt.pka25_co2h AS wt_pka25_co2h,
+    aa_variant.pka25_co2h AS variant_pka25_co2h,
+    aa_wt.pka25_nh2 AS wt_pka25_nh2,
+    aa_variant.pka25_nh2 AS variant_pka25_nh2,
+    aa_wt.isoelectric_point_pl AS wt_isoelectric_point_pl,
+    aa_variant.isoelectric_point_pl AS variant_isoelectric_point_pl,
+    aa_wt.hydropathy_index AS wt_hydropathy_index,
+    aa_variant.hydropathy_index AS variant_hydropathy_index
+FROM
+    substitution_matrix sm
+LEFT JOIN
+    amino_acid_property aa_wt
+    ON aa_wt.one_letter_code = sm.amino_acid_x
+LEFT JOIN
+    amino_acid_property aa_variant
+    ON aa_variant.one_letter_code = sm.amino_acid_y;
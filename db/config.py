@@ -8,12 +8,58 @@ if not DB_URL:
 
 # ESM model path
 ESM_MODEL_PATH = "models/esm_1v/esm1v_t33_650M_UR90S_1.pt"
+# Memory-mappable copy written by populate_esm1v --convert-checkpoint; used
+# instead of ESM_MODEL_PATH once it exists (None always loads ESM_MODEL_PATH)
+ESM_MMAP_MODEL_PATH = "models/esm_1v/esm1v_t33_650M_UR90S_1.mmap.pt"
 
 # Max sequence length for ESM
 MAX_SEQ_LENGTH = 1024
 
-# List of gene IDs to process
-GENE_IDS = [
+# Embed each position in a window of this many residues centred on it (at most
+# MAX_SEQ_LENGTH - 2, checked at startup) instead of the whole sequence; None
+# uses the full sequence truncated to MAX_SEQ_LENGTH
+ESM_CONTEXT_WINDOW = None
+
+# Mutated sequences per variant forward pass, and the cap on padded tokens
+# (sequences x longest length) per pass; a batch size of 1 embeds one at a time
+ESM_BATCH_SIZE = 8
+ESM_TOKEN_BUDGET = 8192
+
+# On-disk cache of WT and variant representations, keyed by a hash of the
+# sequence and the model checkpoint; None disables it
+ESM_CACHE_DIR = "data/esm_cache/"
+
+# One marker file per gene whose embeddings were fully written; populate_esm1v
+# --resume skips these genes
+ESM_PROGRESS_DIR = "data/esm_progress/"
+
+# Genes whose embeddings may wait for the background database writer before
+# model inference pauses
+WRITE_QUEUE_SIZE = 4
+
+# Apply dynamic int8 quantization to the linear layers of ESM-1v (CPU only)
+ESM_QUANTIZE = False
+
+# Intra- and inter-op torch threads of a single-process run; None keeps the
+# torch defaults
+ESM_INTRA_OP_THREADS = None
+ESM_INTER_OP_THREADS = None
+
+# Worker processes for populate_esm1v, each embedding its own share of the genes,
+# and the intra-op threads of each (None splits the CPU cores evenly)
+ESM_WORKERS = 1
+ESM_THREADS_PER_WORKER = None
+
+# Embeddings are stored as packed big-endian float32 bytea, the layout of
+# Postgres' float4send
+EMBEDDING_DTYPE = ">f4"
+
+# Also store Difference embeddings (Variant - WT). Preprocessing derives them on
+# demand, so they are only needed by other consumers of the database
+STORE_DIFFERENCE_EMBEDDINGS = False
+
+# Genes of the Domainome training set
+DOMAINOME_GENE_IDS = [
     552,
     555,
     559,
@@ -154,6 +200,10 @@ GENE_IDS = [
     1035,
     1045,
     1046,
+]
+
+# Genes held out of training, used for inference
+NON_DOMAINOME_GENE_IDS = [
     7,
     10,
     100,
@@ -163,3 +213,6 @@ GENE_IDS = [
     215,
     505,
 ]
+
+# List of gene IDs to process
+GENE_IDS = DOMAINOME_GENE_IDS + NON_DOMAINOME_GENE_IDS
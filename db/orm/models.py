@@ -8,10 +8,10 @@ from sqlalchemy import (
     Boolean,
     UniqueConstraint,
     CheckConstraint,
+    LargeBinary,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.dialects.postgresql import JSONB
 
 Base = declarative_base()
 
@@ -68,6 +68,9 @@ class GeneURN(Base):
     assay = relationship("Assay", back_populates="gene_urns")
     mutations = relationship("Mutation", back_populates="gene_urn")
     dms_range = relationship("DmsRange", back_populates="gene_urn", uselist=False)
+    esm1v_position_embeddings = relationship(
+        "ESM1vPositionEmbedding", back_populates="gene_urn", cascade="all, delete-orphan"
+    )
 
 
 class Mutation(Base):
@@ -120,11 +123,30 @@ class ESM1vEmbedding(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     mutation_id = Column(Integer, ForeignKey("mutation.id"), nullable=False)
     embedding_type = Column(Text, nullable=False)
-    embedding = Column(JSONB, nullable=False)
+    # Packed float32 vector, see db.config.EMBEDDING_DTYPE
+    embedding = Column(LargeBinary, nullable=False)
 
     mutation = relationship("Mutation", back_populates="esm1v_embeddings")
 
 
+class ESM1vPositionEmbedding(Base):
+    """Wild-type ESM-1v embedding, shared by every mutation at a position."""
+
+    __tablename__ = "esm1v_position_embeddings"
+
+    __table_args__ = (
+        UniqueConstraint("gene_urn_id", "position", name="unique_gene_position"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    gene_urn_id = Column(Integer, ForeignKey("gene_urn.id"), nullable=False)
+    position = Column(Integer, nullable=False)
+    # Packed float32 vector, see db.config.EMBEDDING_DTYPE
+    embedding = Column(LargeBinary, nullable=False)
+
+    gene_urn = relationship("GeneURN", back_populates="esm1v_position_embeddings")
+
+
 # ---------------------------------------------------------------------
 # DMS
 # ---------------------------------------------------------------------
@@ -0,0 +1,38 @@
+-- Store wild-type ESM-1v embeddings once per (gene, position).
+--
+-- Every mutation at a position shares the same wild-type embedding, so the
+-- per-mutation 'WT' rows of esm1v_embeddings are moved into their own table.
+
+BEGIN;
+
+CREATE TABLE public.esm1v_position_embeddings (
+    id SERIAL PRIMARY KEY,
+    gene_urn_id integer NOT NULL REFERENCES public.gene_urn(id),
+    "position" integer NOT NULL,
+    embedding jsonb NOT NULL,
+    CONSTRAINT unique_gene_position UNIQUE (gene_urn_id, "position")
+);
+
+INSERT INTO public.esm1v_position_embeddings (gene_urn_id, "position", embedding)
+SELECT DISTINCT ON (m.gene_urn_id, m.position)
+    m.gene_urn_id,
+    m.position,
+    e.embedding
+FROM
+    public.esm1v_embeddings e
+JOIN
+    public.mutation m
+    ON m.id = e.mutation_id
+WHERE
+    e.embedding_type = 'WT'
+ORDER BY
+    m.gene_urn_id, m.position, e.id;
+
+GRANT ALL ON TABLE public.esm1v_position_embeddings TO polina;
+GRANT ALL ON TABLE public.esm1v_position_embeddings TO polina_py;
+GRANT ALL ON SEQUENCE public.esm1v_position_embeddings_id_seq TO polina;
+GRANT ALL ON SEQUENCE public.esm1v_position_embeddings_id_seq TO polina_py;
+
+DELETE FROM public.esm1v_embeddings WHERE embedding_type = 'WT';
+
+COMMIT;
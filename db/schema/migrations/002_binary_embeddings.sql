@@ -0,0 +1,25 @@
+-- Store ESM-1v embeddings as packed big-endian float32 bytea instead of JSONB.
+--
+-- float4send yields the 4-byte big-endian encoding of each element, which the
+-- extraction decodes with np.frombuffer(..., dtype=">f4").
+
+BEGIN;
+
+CREATE FUNCTION pg_temp.jsonb_to_float4_bytea(embedding jsonb) RETURNS bytea
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT string_agg(float4send(value::float4), ''::bytea ORDER BY ordinality)
+    FROM jsonb_array_elements_text(embedding) WITH ORDINALITY
+$$;
+
+ALTER TABLE public.esm1v_embeddings
+    ALTER COLUMN embedding TYPE bytea
+    USING pg_temp.jsonb_to_float4_bytea(embedding);
+
+ALTER TABLE public.esm1v_position_embeddings
+    ALTER COLUMN embedding TYPE bytea
+    USING pg_temp.jsonb_to_float4_bytea(embedding);
+
+COMMIT;
+
+ANALYZE public.esm1v_embeddings;
+ANALYZE public.esm1v_position_embeddings;
@@ -0,0 +1,81 @@
+-- Indexes and materialized feature view behind data/queries/extract_data.sql.
+--
+-- The schema only declares primary and unique keys, so every foreign-key join
+-- of the extraction was a hash join over a full table. Safe to re-run.
+
+BEGIN;
+
+-- Foreign keys followed by the extraction
+CREATE INDEX IF NOT EXISTS mutation_gene_urn_id_idx
+    ON public.mutation (gene_urn_id, id);
+CREATE INDEX IF NOT EXISTS mutation_mutation_type_id_idx
+    ON public.mutation (mutation_type_id);
+CREATE INDEX IF NOT EXISTS dms_mutation_id_idx
+    ON public.dms (mutation_id) INCLUDE (score);
+CREATE INDEX IF NOT EXISTS gene_urn_assay_type_idx
+    ON public.gene_urn (assay_type);
+-- esm1v_embeddings (mutation_id, embedding_type), dms_range (gene_urn_id) and
+-- esm1v_position_embeddings (gene_urn_id, position) are covered by their
+-- unique constraints
+
+-- One flattened feature row per (mutation, DMS score), without embeddings.
+-- Refresh with: python -m db.scripts.refresh_feature_view
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.mutation_features AS
+SELECT
+    g.id AS gene_id,
+    m.id AS mutation_id,
+    dms.id AS dms_id,
+    m.position,
+    m.wt_residue,
+    m.variant_residue,
+    m.eve_score,
+    m.eve_class_75_set,
+    dms.score AS dms_score,
+    g.assay_type,
+    dr.synonymous_from_method AS wt_score,
+    dr.nonsense_from_method AS non_score,
+    m.edit_distance,
+    m.alphamissense_pathogenicity,
+    m.alphafold_conf_type,
+    mt.type AS mutation_type
+FROM
+    mutation m
+JOIN
+    dms
+    ON dms.mutation_id = m.id
+JOIN
+    gene_urn g
+    ON m.gene_urn_id = g.id
+JOIN
+    assay a
+    ON g.assay_type = a.id
+JOIN
+    dms_range dr
+    ON g.id = dr.gene_urn_id
+JOIN
+    mutation_type mt
+    ON m.mutation_type_id = mt.id
+WHERE
+    dms.score IS NOT NULL
+    AND EXISTS (
+        SELECT 1
+        FROM substitution_matrix sm
+        WHERE sm.amino_acid_x = m.wt_residue AND sm.amino_acid_y = m.variant_residue
+    )
+    AND m.eve_score != 'NaN'
+    AND dr.synonymous_from_method IS NOT NULL
+    AND dr.nonsense_from_method IS NOT NULL
+WITH DATA;
+
+-- Unique key for REFRESH ... CONCURRENTLY and ordered per-gene scans
+CREATE UNIQUE INDEX IF NOT EXISTS mutation_features_key
+    ON public.mutation_features (gene_id, mutation_id, dms_id);
+
+GRANT SELECT ON public.mutation_features TO polina;
+GRANT SELECT ON public.mutation_features TO polina_py;
+
+COMMIT;
+
+ANALYZE public.mutation;
+ANALYZE public.dms;
+ANALYZE public.mutation_features;
@@ -1,111 +1,680 @@
+import os
+import io
+import copy
+import glob
+import argparse
+import multiprocessing
+import queue
+import hashlib
+import threading
+import numpy as np
 import torch
 import esm
-import numpy as np
-from db.orm.models import GeneURN, Mutation, ESM1vEmbedding
-from db.orm.session import get_session
+from db.orm.models import GeneURN, Mutation, ESM1vEmbedding, ESM1vPositionEmbedding
+from db.orm.session import get_session, engine
 import db.config as config
 
-# Database setup
-session = get_session()
 
-# Load pretrained ESM-1v model and alphabet
-model, alphabet = esm.pretrained.load_model_and_alphabet_local(config.ESM_MODEL_PATH)
-batch_converter = alphabet.get_batch_converter()
-model.eval()
+def make_batches(items, batch_size, token_budget):
+    """Group ``(key, sequence, position)`` items into batches of similar length.
 
-for gene_id in config.GENE_IDS:
-    gene = session.query(GeneURN).filter(GeneURN.id == gene_id).first()
-    if not gene or not gene.target_aa_seq:
-        continue
+    Items are bucketed by sequence length so little padding is needed, and each
+    batch holds at most ``batch_size`` items and ``token_budget`` padded tokens.
+    """
+    batch = []
+    for item in sorted(items, key=lambda item: len(item[1])):
+        n_tokens = (len(batch) + 1) * (len(item[1]) + 2)
+        if batch and (len(batch) == batch_size or n_tokens > token_budget):
+            yield batch
+            batch = []
+        batch.append(item)
+    if batch:
+        yield batch
 
-    sequence_label = gene.gene_name or f"gene_{gene.id}"
-    sequence = gene.target_aa_seq[: config.MAX_SEQ_LENGTH]
-    seq_len = len(sequence)
 
-    if seq_len < 1:
-        continue
+def embed_positions(model, batch_converter, batch):
+    """Run one forward pass over a batch and return the representation of each
+    item's (1-based) position as a (len(batch) x dim) array."""
+    _, _, batch_tokens = batch_converter([(str(key), seq) for key, seq, _ in batch])
+    with torch.no_grad():
+        token_representations = model(
+            batch_tokens, repr_layers=[33], return_contacts=False
+        )
+    # Token 0 is BOS, so residue ``pos`` sits at token ``pos``
+    positions = torch.tensor([pos for _, _, pos in batch])
+    return token_representations["representations"][33][
+        torch.arange(len(batch)), positions
+    ].numpy()
 
-    # Convert full sequence to tokens for ESM embedding
-    batch_labels, batch_strs, batch_tokens = batch_converter(
-        [(sequence_label, sequence)]
-    )
 
+def embed_sequence(model, batch_converter, label, sequence):
+    """Return the per-residue representations of a whole sequence."""
+    batch_labels, batch_strs, batch_tokens = batch_converter([(label, sequence)])
     with torch.no_grad():
         token_representations = model(
             batch_tokens, repr_layers=[33], return_contacts=False
         )
-        residue_embeddings = token_representations["representations"][33][
-            0, 1 : seq_len + 1
+    return token_representations["representations"][33][
+        0, 1 : len(sequence) + 1
+    ].numpy()
+
+
+def convert_checkpoint(model_path, mmap_path):
+    """Re-save an ESM checkpoint as the final model state in torch's zipfile
+    format, which ``load_mmap_model`` can memory-map."""
+    model, alphabet = esm.pretrained.load_model_and_alphabet_local(model_path)
+    os.makedirs(os.path.dirname(mmap_path), exist_ok=True)
+    torch.save(
+        {
+            "args": model.args,
+            "state_dict": model.state_dict(),
+            "checkpoint": checkpoint_fingerprint(model_path),
+        },
+        f"{mmap_path}.tmp",
+    )
+    os.replace(f"{mmap_path}.tmp", mmap_path)
+
+
+def load_mmap_model(mmap_path):
+    """Build ESM-1v around weights memory-mapped from a converted checkpoint.
+
+    The model is created on the meta device and takes over the mapped tensors,
+    so no weights are read until used and processes share the page cache.
+    Returns the model, its alphabet and the fingerprint of the source checkpoint.
+    """
+    data = torch.load(mmap_path, mmap=True, weights_only=False)
+    alphabet = esm.Alphabet.from_architecture(data["args"].arch)
+    with torch.device("meta"):
+        model = esm.ProteinBertModel(data["args"], alphabet)
+    model.load_state_dict(data["state_dict"], assign=True)
+    if any(tensor.is_meta for tensor in model.state_dict().values()):
+        raise ValueError(f"{mmap_path} does not hold every model weight")
+    return model, alphabet, data["checkpoint"]
+
+
+def quantize(model):
+    """Dynamically quantize the linear layers of the model to int8."""
+    model = torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    # The fused attention path reads q/k/v weights and biases as tensors, which
+    # quantized linears expose as methods; run the projections as modules instead
+    for layer in model.layers:
+        layer.self_attn.enable_torch_version = False
+    return model
+
+
+def context_window(sequence, pos, window):
+    """Return the ``window`` residues of ``sequence`` centred on the 1-based
+    ``pos``, and the position within that window."""
+    if window is None or len(sequence) <= window:
+        return sequence, pos
+    start = min(max(pos - 1 - window // 2, 0), len(sequence) - window)
+    return sequence[start : start + window], pos - start
+
+
+def mutated_sequence(sequence, pos, aa):
+    """Return ``sequence`` with the residue at ``pos`` replaced by ``aa``, or None
+    if the substitution cannot be embedded."""
+    if not (1 <= pos <= len(sequence)) or not aa or len(aa) != 1:
+        return None
+    mutated_seq = sequence[: pos - 1] + aa + sequence[pos:]
+    if "*" in mutated_seq:
+        return None
+    return mutated_seq
+
+
+def checkpoint_fingerprint(path):
+    """Identify a model checkpoint by its file name and size without reading it."""
+    return f"{os.path.basename(path)}:{os.path.getsize(path)}"
+
+
+def cache_path(sequence, checkpoint):
+    """Return the cache directory of a sequence embedded with a checkpoint."""
+    digest = hashlib.sha256(f"{checkpoint}\n{sequence}".encode()).hexdigest()
+    return os.path.join(config.ESM_CACHE_DIR, digest[:2], digest)
+
+
+def load_cache(path):
+    """Return the cached WT representations (None if missing) and the cached
+    variant representations keyed by ``f"{position}{residue}"``."""
+    wt_path = os.path.join(path, "wt.npy")
+    residue_embeddings = np.load(wt_path) if os.path.exists(wt_path) else None
+    variants = {}
+    for variant_path in glob.glob(os.path.join(path, "variants", "*.npy")):
+        variants[os.path.basename(variant_path)[:-4]] = np.load(variant_path)
+    return residue_embeddings, variants
+
+
+def save_cache(path, residue_embeddings, variants):
+    """Write the representations of a sequence, replacing files atomically.
+
+    Each variant is its own file and only missing ones are written, so workers
+    caching the same sequence add to the cache without dropping each other's
+    variants. Temporary files are named per process.
+    """
+    os.makedirs(os.path.join(path, "variants"), exist_ok=True)
+    pid = os.getpid()
+    if residue_embeddings is not None:
+        tmp = os.path.join(path, f"wt.{pid}.tmp.npy")
+        np.save(tmp, residue_embeddings)
+        os.replace(tmp, os.path.join(path, "wt.npy"))
+    for key, embedding in variants.items():
+        variant_path = os.path.join(path, "variants", f"{key}.npy")
+        if os.path.exists(variant_path):
+            continue
+        tmp = os.path.join(path, "variants", f"{key}.{pid}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, embedding)
+        os.replace(tmp, variant_path)
+
+
+def copy_rows(connection, table, columns, rows):
+    """Stream rows into ``table`` with one COPY; bytes are written as bytea hex."""
+    buffer = io.StringIO()
+    for row in rows:
+        values = [
+            "\\\\x" + value.hex() if isinstance(value, bytes) else str(value)
+            for value in row
         ]
+        buffer.write("\t".join(values) + "\n")
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    connection.commit()
+
+
+class BackgroundWriter:
+    """COPY batches of rows into Postgres on a separate thread.
+
+    Batches are handed over through a bounded queue, so model inference keeps
+    running while earlier genes are written, and stalls once ``max_pending``
+    batches are waiting.
+    """
+
+    def __init__(self, max_pending):
+        self.batches = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        connection = engine.raw_connection()
+        try:
+            while (batch := self.batches.get()) is not None:
+                table, columns, rows, done = batch
+                if rows:
+                    copy_rows(connection, table, columns, rows)
+                if done is not None:
+                    mark_gene_done(done)
+        except Exception as error:
+            self.error = error
+            # Keep draining so the producer never blocks on a dead writer
+            while self.batches.get() is not None:
+                pass
+        finally:
+            connection.close()
+
+    def put(self, table, columns, rows, done=None):
+        """Queue rows for COPY; ``done`` marks that gene complete once written."""
+        if self.error is not None:
+            raise self.error
+        if rows or done is not None:
+            self.batches.put((table, columns, rows, done))
+
+    def close(self):
+        self.batches.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
 
-    # Pre-cache WT embeddings for difference calculation
-    wt_embeddings = {}
+def completed_genes():
+    """Return the genes an earlier run finished writing."""
+    pattern = os.path.join(config.ESM_PROGRESS_DIR, "gene_*.done")
+    return {int(os.path.basename(path)[5:-5]) for path in glob.glob(pattern)}
+
+
+def mark_gene_done(gene_id):
+    os.makedirs(config.ESM_PROGRESS_DIR, exist_ok=True)
+    open(os.path.join(config.ESM_PROGRESS_DIR, f"gene_{gene_id}.done"), "w").close()
+
+
+def populate_gene(gene, session, model, batch_converter, checkpoint, writer):
+    """Embed the missing WT, Variant and Difference rows of one gene."""
+    window = config.ESM_CONTEXT_WINDOW
+    sequence_label = gene.gene_name or f"gene_{gene.id}"
+    sequence = gene.target_aa_seq
+    if window is None:
+        sequence = sequence[: config.MAX_SEQ_LENGTH]
+    seq_len = len(sequence)
 
     mutations = (
         session.query(Mutation).filter(Mutation.gene_urn_id == gene.id).distinct().all()
     )
+
+    # Rows already in the database are skipped, so reruns never collide with
+    # the unique constraints
+    existing = {
+        tuple(row)
+        for row in session.query(
+            ESM1vEmbedding.mutation_id, ESM1vEmbedding.embedding_type
+        )
+        .join(Mutation, Mutation.id == ESM1vEmbedding.mutation_id)
+        .filter(Mutation.gene_urn_id == gene.id)
+    }
+    stored_positions = {
+        pos
+        for (pos,) in session.query(ESM1vPositionEmbedding.position).filter(
+            ESM1vPositionEmbedding.gene_urn_id == gene.id
+        )
+    }
+    embedding_types = ["Variant"]
+    if config.STORE_DIFFERENCE_EMBEDDINGS:
+        embedding_types.append("Difference")
+
+    # Substitutions with missing rows; each distinct one is embedded only once
+    positions = {m.position for m in mutations if 1 <= m.position <= seq_len}
+    positions = sorted(positions - stored_positions)
+    substitutions = []
     for mutation in mutations:
         pos = mutation.position
-        if not (1 <= pos <= seq_len):
+        aa = mutation.variant_residue
+        mutated_seq = mutated_sequence(sequence, pos, aa)
+        if mutated_seq is None:
             continue
 
-        wt_embed = residue_embeddings[pos - 1].tolist()
-        wt_embeddings[mutation.id] = wt_embed
+        missing = [t for t in embedding_types if (mutation.id, t) not in existing]
+        if missing:
+            substitutions.append((mutation.id, mutated_seq, pos, aa, missing))
 
-        session.add(
-            ESM1vEmbedding(
-                mutation_id=mutation.id,
-                embedding_type="WT",
-                embedding=wt_embed,
-            )
+    # Representations computed for this sequence by earlier genes or runs
+    cache = None
+    if config.ESM_CACHE_DIR:
+        context = checkpoint if window is None else f"{checkpoint}:window={window}"
+        cache = cache_path(sequence, context)
+    residue_embeddings, variants = load_cache(cache) if cache else (None, {})
+
+    wt_positions = set(positions) | {
+        pos for _, _, pos, _, missing in substitutions if "Difference" in missing
+    }
+    pending = {}
+    if window is None and residue_embeddings is None and wt_positions:
+        residue_embeddings = embed_sequence(
+            model, batch_converter, sequence_label, sequence
         )
+    elif window is not None:
+        # A windowed WT representation is the position's own residue, embedded in
+        # the same window as its variants
+        for pos in wt_positions:
+            key = f"{pos}{sequence[pos - 1]}"
+            if key not in variants:
+                pending[key] = (key, *context_window(sequence, pos, window))
 
-    session.commit()
+    for _, mutated_seq, pos, aa, _ in substitutions:
+        key = f"{pos}{aa}"
+        if key not in variants:
+            pending[key] = (key, *context_window(mutated_seq, pos, window))
+    for batch in make_batches(
+        pending.values(), config.ESM_BATCH_SIZE, config.ESM_TOKEN_BUDGET
+    ):
+        variant_embeddings = embed_positions(model, batch_converter, batch)
+        variants.update(zip([key for key, _, _ in batch], variant_embeddings))
 
-    # Compute and store Variant and Difference embeddings
-    for mutation in mutations:
-        pos = mutation.position
-        aa = mutation.variant_residue
+    if cache:
+        save_cache(cache, residue_embeddings, variants)
 
-        if not (1 <= pos <= seq_len) or not aa or len(aa) != 1:
-            continue
+    wt_embeddings = {
+        pos: (
+            residue_embeddings[pos - 1]
+            if window is None
+            else variants[f"{pos}{sequence[pos - 1]}"]
+        )
+        for pos in wt_positions
+    }
+
+    # Store each WT embedding once per position; mutations at a position share it
+    writer.put(
+        ESM1vPositionEmbedding.__tablename__,
+        ["gene_urn_id", "position", "embedding"],
+        [
+            (gene.id, pos, wt_embeddings[pos].astype(config.EMBEDDING_DTYPE).tobytes())
+            for pos in positions
+        ],
+    )
 
-        mutated_seq = sequence[: pos - 1] + aa + sequence[pos:]
+    # Store Variant (and optionally Difference) embeddings, then mark the gene done
+    rows = []
+    for mutation_id, _, pos, aa, missing in substitutions:
+        variant_embedding = variants[f"{pos}{aa}"]
+        if "Variant" in missing:
+            rows.append(
+                (
+                    mutation_id,
+                    "Variant",
+                    variant_embedding.astype(config.EMBEDDING_DTYPE).tobytes(),
+                )
+            )
 
-        if "*" in mutated_seq:
+        if "Difference" in missing:
+            diff_embedding = variant_embedding - wt_embeddings[pos]
+            rows.append(
+                (
+                    mutation_id,
+                    "Difference",
+                    diff_embedding.astype(config.EMBEDDING_DTYPE).tobytes(),
+                )
+            )
+    writer.put(
+        ESM1vEmbedding.__tablename__,
+        ["mutation_id", "embedding_type", "embedding"],
+        rows,
+        done=gene.id,
+    )
+
+
+def window_report(genes, session, model, batch_converter, window, n_samples):
+    """Print how far windowed variant representations deviate from full-context
+    ones on a random sample of substitutions in sequences longer than ``window``."""
+    items = []
+    for gene in session.query(GeneURN).filter(GeneURN.id.in_(genes)):
+        sequence = gene.target_aa_seq or ""
+        if not (window < len(sequence) <= config.MAX_SEQ_LENGTH):
             continue
+        for mutation in session.query(Mutation).filter(Mutation.gene_urn_id == gene.id):
+            pos = mutation.position
+            mutated_seq = mutated_sequence(sequence, pos, mutation.variant_residue)
+            if mutated_seq is not None:
+                items.append((mutation.id, mutated_seq, pos))
+    if not items:
+        print(f"No substitutions in sequences longer than {window} residues")
+        return
+
+    rng = np.random.default_rng(0)
+    sample = [
+        items[i]
+        for i in rng.choice(len(items), size=min(n_samples, len(items)), replace=False)
+    ]
+    windowed = [(key, *context_window(seq, pos, window)) for key, seq, pos in sample]
+
+    embeddings = {}
+    for name, batch_items in [("full", sample), ("windowed", windowed)]:
+        embeddings[name] = {}
+        for batch in make_batches(
+            batch_items, config.ESM_BATCH_SIZE, config.ESM_TOKEN_BUDGET
+        ):
+            batch_embeddings = embed_positions(model, batch_converter, batch)
+            embeddings[name].update(zip([key for key, _, _ in batch], batch_embeddings))
+
+    keys = [key for key, _, _ in sample]
+    full = np.stack([embeddings["full"][key] for key in keys])
+    approx = np.stack([embeddings["windowed"][key] for key in keys])
+    cosine = (full * approx).sum(axis=1) / (
+        np.linalg.norm(full, axis=1) * np.linalg.norm(approx, axis=1)
+    )
+    relative_error = np.linalg.norm(full - approx, axis=1) / np.linalg.norm(
+        full, axis=1
+    )
+    print(f"Window {window} vs full context on {len(keys)} substitutions")
+    print(
+        f"  cosine similarity: mean {cosine.mean():.4f}, "
+        f"5th percentile {np.percentile(cosine, 5):.4f}, min {cosine.min():.4f}"
+    )
+    print(f"  relative L2 error: mean {relative_error.mean():.4f}")
+
+
+def quantization_report(gene_id, session, model, batch_converter):
+    """Print how int8 dynamic quantization changes the representations of a
+    held-out gene, and the RMSE of its leave-one-protein-out LightGBM model on
+    features built from fp32 and from int8 representations."""
+    # Only the report needs the training code
+    import lightgbm as lgb
+    import src.config as src_config
+    from src.data_utils import load_data, set_features
+
+    window = config.ESM_CONTEXT_WINDOW
+    gene = session.query(GeneURN).filter(GeneURN.id == gene_id).one()
+    sequence = gene.target_aa_seq[: config.MAX_SEQ_LENGTH]
+    items = []
+    for mutation in session.query(Mutation).filter(Mutation.gene_urn_id == gene_id):
+        pos = mutation.position
+        mutated_seq = mutated_sequence(sequence, pos, mutation.variant_residue)
+        if mutated_seq is not None:
+            items.append((mutation.id, *context_window(mutated_seq, pos, window)))
 
-        batch_labels, batch_strs, batch_tokens = batch_converter(
-            [(sequence_label, mutated_seq)]
+    representations = {}
+    for name, embedder in [("fp32", model), ("int8", quantize(copy.deepcopy(model)))]:
+        variants = {}
+        for batch in make_batches(
+            items, config.ESM_BATCH_SIZE, config.ESM_TOKEN_BUDGET
+        ):
+            batch_embeddings = embed_positions(embedder, batch_converter, batch)
+            variants.update(zip([key for key, _, _ in batch], batch_embeddings))
+        wt = embed_sequence(embedder, batch_converter, str(gene_id), sequence)
+        representations[name] = (wt, variants)
+
+    def cosine(a, b):
+        return (a * b).sum(axis=1) / (
+            np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
         )
-        with torch.no_grad():
-            token_representations = model(
-                batch_tokens, repr_layers=[33], return_contacts=False
-            )
-            variant_embedding = token_representations["representations"][33][
-                0, pos
-            ].tolist()
-
-        session.add(
-            ESM1vEmbedding(
-                mutation_id=mutation.id,
-                embedding_type="Variant",
-                embedding=variant_embedding,
-            )
+
+    (wt_fp32, variants_fp32), (wt_int8, variants_int8) = representations.values()
+    wt_cosine = cosine(wt_fp32, wt_int8)
+    keys = list(variants_fp32)
+    variant_cosine = cosine(
+        np.stack([variants_fp32[key] for key in keys]),
+        np.stack([variants_int8[key] for key in keys]),
+    )
+    print(f"int8 vs fp32 representations of gene {gene_id}")
+    print(
+        f"  WT per-position cosine: mean {wt_cosine.mean():.4f}, "
+        f"min {wt_cosine.min():.4f}"
+    )
+    print(
+        f"  variant cosine: mean {variant_cosine.mean():.4f}, "
+        f"min {variant_cosine.min():.4f}"
+    )
+
+    # Downstream error of the model trained without this gene
+    model_path = os.path.join(
+        os.path.dirname(src_config.MODEL_PATH),
+        "lopo_models",
+        f"lgbm_model_excluding_gene_{gene_id}.pkl",
+    )
+    if not os.path.exists(model_path):
+        print(f"  no leave-one-protein-out model at {model_path}")
+        return
+    booster = lgb.Booster(model_file=model_path)
+    data = load_data(src_config.DATA_PATH, mode="drop")
+    data = data[data["gene_id"] == gene_id]
+    X = set_features(data, "drop", embedding_store=src_config.EMBEDDING_STORE_DIR)
+    y = data["normalized_dms_score"].to_numpy()
+
+    rmse = {}
+    for name, (wt, variants) in representations.items():
+        features = X.copy()
+        dim = wt.shape[1]
+        in_sequence = data["position"].between(1, len(sequence)).to_numpy()
+        wt_block = np.full((len(data), dim), np.nan, dtype=np.float32)
+        wt_block[in_sequence] = wt[data["position"].to_numpy()[in_sequence] - 1]
+        features[[f"wt_embedding_{i}" for i in range(dim)]] = wt_block
+        features[[f"variant_embedding_{i}" for i in range(dim)]] = np.stack(
+            [
+                variants.get(mutation_id, np.full(dim, np.nan, dtype=np.float32))
+                for mutation_id in data["mutation_id"]
+            ]
         )
+        y_pred = booster.predict(features[booster.feature_name()])
+        rmse[name] = np.sqrt(np.mean((y - y_pred) ** 2))
+    print(
+        f"  LightGBM RMSE: fp32 {rmse['fp32']:.4f}, int8 {rmse['int8']:.4f}, "
+        f"delta {rmse['int8'] - rmse['fp32']:+.4f}"
+    )
 
-        if mutation.id in wt_embeddings:
-            diff_embedding = (
-                np.array(variant_embedding) - np.array(wt_embeddings[mutation.id])
-            ).tolist()
-            session.add(
-                ESM1vEmbedding(
-                    mutation_id=mutation.id,
-                    embedding_type="Difference",
-                    embedding=diff_embedding,
-                )
-            )
 
-    session.commit()
+def populate_genes(gene_ids, model, batch_converter, checkpoint, threads=None):
+    """Embed ``gene_ids`` with this process's own session and background writer.
+
+    ``threads`` pins the intra-op thread count of a sharded worker.
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    # Connections inherited from a parent process must not be reused
+    engine.dispose(close=False)
+    session = get_session()
+    writer = BackgroundWriter(config.WRITE_QUEUE_SIZE)
+
+    for gene_id in gene_ids:
+        gene = session.query(GeneURN).filter(GeneURN.id == gene_id).first()
+        if not gene or not gene.target_aa_seq:
+            continue
+
+        populate_gene(gene, session, model, batch_converter, checkpoint, writer)
+        # End the read transaction so it does not stay open for the whole backfill
+        session.commit()
+
+    writer.close()
+    session.close()
+
+
+def populate_sharded(
+    gene_ids, model, batch_converter, checkpoint, n_workers, share_weights=True
+):
+    """Spread genes round-robin over forked worker processes.
+
+    With ``share_weights``, the model weights are moved to shared memory before
+    forking, so every worker reads the same copy instead of loading its own;
+    memory-mapped weights are shared through the page cache already.
+    """
+    if share_weights:
+        model.share_memory()
+    threads = config.ESM_THREADS_PER_WORKER or max(
+        1, (os.cpu_count() or 1) // n_workers
+    )
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(
+            target=populate_genes,
+            args=(gene_ids[i::n_workers], model, batch_converter, checkpoint, threads),
+        )
+        for i in range(n_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    failed = [worker.pid for worker in workers if worker.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"Embedding workers {failed} failed")
+
+
+parser = argparse.ArgumentParser(description="Populate ESM-1v embeddings.")
+parser.add_argument(
+    "--genes",
+    type=int,
+    nargs="+",
+    default=config.GENE_IDS,
+    help="gene_urn ids to embed (default: config.GENE_IDS)",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="skip genes an earlier run finished writing",
+)
+parser.add_argument(
+    "--window-report",
+    type=int,
+    metavar="N",
+    help="compare ESM_CONTEXT_WINDOW with full context on N sampled "
+    "substitutions and exit without writing",
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=config.ESM_WORKERS,
+    help="worker processes sharing one copy of the model (default: ESM_WORKERS)",
+)
+parser.add_argument(
+    "--quantization-report",
+    type=int,
+    metavar="GENE_ID",
+    help="compare int8 with fp32 representations of a held-out gene, and the "
+    "RMSE of its leave-one-protein-out model, then exit without writing",
+)
+parser.add_argument(
+    "--convert-checkpoint",
+    action="store_true",
+    help="convert ESM_MODEL_PATH into the memory-mappable ESM_MMAP_MODEL_PATH "
+    "and exit",
+)
+args = parser.parse_args()
+# The window plus the BOS and EOS tokens must fit the model's positions
+if config.ESM_CONTEXT_WINDOW is not None and not (
+    0 < config.ESM_CONTEXT_WINDOW <= config.MAX_SEQ_LENGTH - 2
+):
+    parser.error(
+        f"ESM_CONTEXT_WINDOW must be between 1 and {config.MAX_SEQ_LENGTH - 2}"
+    )
+if args.window_report and config.ESM_CONTEXT_WINDOW is None:
+    parser.error("--window-report needs ESM_CONTEXT_WINDOW set in db/config.py")
+
+# CPU threading; inter-op threads must be set before any parallel work
+if config.ESM_INTRA_OP_THREADS:
+    torch.set_num_threads(config.ESM_INTRA_OP_THREADS)
+if config.ESM_INTER_OP_THREADS:
+    torch.set_num_interop_threads(config.ESM_INTER_OP_THREADS)
+
+if args.convert_checkpoint:
+    convert_checkpoint(config.ESM_MODEL_PATH, config.ESM_MMAP_MODEL_PATH)
+    raise SystemExit
 
-session.close()
+# Load pretrained ESM-1v model and alphabet, memory-mapped once converted
+mmapped = bool(config.ESM_MMAP_MODEL_PATH) and os.path.exists(
+    config.ESM_MMAP_MODEL_PATH
+)
+if mmapped:
+    model, alphabet, checkpoint = load_mmap_model(config.ESM_MMAP_MODEL_PATH)
+else:
+    model, alphabet = esm.pretrained.load_model_and_alphabet_local(
+        config.ESM_MODEL_PATH
+    )
+    checkpoint = checkpoint_fingerprint(config.ESM_MODEL_PATH)
+batch_converter = alphabet.get_batch_converter()
+model.eval()
+
+if args.quantization_report:
+    session = get_session()
+    quantization_report(args.quantization_report, session, model, batch_converter)
+    session.close()
+    raise SystemExit
+
+if config.ESM_QUANTIZE:
+    model = quantize(model)
+    checkpoint = f"{checkpoint}:int8"
+
+if args.window_report:
+    session = get_session()
+    window_report(
+        args.genes,
+        session,
+        model,
+        batch_converter,
+        config.ESM_CONTEXT_WINDOW,
+        args.window_report,
+    )
+    session.close()
+    raise SystemExit
+
+done = completed_genes() if args.resume else set()
+gene_ids = [gene_id for gene_id in args.genes if gene_id not in done]
+if args.workers > 1:
+    populate_sharded(
+        gene_ids,
+        model,
+        batch_converter,
+        checkpoint,
+        args.workers,
+        share_weights=not mmapped,
+    )
+else:
+    populate_genes(gene_ids, model, batch_converter, checkpoint)
@@ -0,0 +1,8 @@
+from sqlalchemy import text
+from db.orm.session import engine
+
+# Rebuild the mutation_features view after loading new mutations or scores.
+# CONCURRENTLY keeps the view readable by running extractions meanwhile.
+with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+    conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY mutation_features"))
+    conn.execute(text("ANALYZE mutation_features"))
@@ -1,25 +1,80 @@
 import os
 from decouple import config as env_config
+from db.config import DOMAINOME_GENE_IDS, NON_DOMAINOME_GENE_IDS
 
 # Environment variables
 DB_URL = env_config("DB_URL", default=None)
 if not DB_URL:
     raise ValueError("Environment variable DB_URL is not set.")
 
+# Read feature rows from the mutation_features materialized view instead of
+# joining the base tables (db/schema/migrations/003_extraction_indexes.sql)
+USE_FEATURE_VIEW = False
+
+# Compute the normalized DMS score and its per-gene and per-position summaries
+# with SQL window functions instead of transferring the raw scores to pandas
+SQL_SCORE_SUMMARIES = False
+
 # File paths
-QUERY_PATH = "data/queries/extract_data.sql"
+BASE_QUERY_PATH = (
+    "data/queries/extract_features_view.sql"
+    if USE_FEATURE_VIEW
+    else "data/queries/extract_data.sql"
+)
+QUERY_PATH = (
+    BASE_QUERY_PATH.replace(".sql", "_scores.sql")
+    if SQL_SCORE_SUMMARIES
+    else BASE_QUERY_PATH
+)
+PAIR_QUERY_PATH = "data/queries/residue_pairs.sql"
+POSITION_QUERY_PATH = "data/queries/position_embeddings.sql"
 
 RAW_DATA_PATH = "data/raw/domainome.csv"
-PROCESSED_DATA_PATH = "data/domainome_preprocessed.csv"
-DATA_PATH = PROCESSED_DATA_PATH
+PROCESSED_DATA_PATH = "data/domainome_preprocessed.parquet"
+PROCESSED_SHARDS_DIR = "data/domainome_preprocessed_shards/"
+FINGERPRINTS_PATH = "data/domainome_gene_fingerprints.json"
+GENE_PARTITIONS_DIR = "data/domainome_preprocessed_genes/"
 INFERENCE_DATA_PATH = "data/non_domainome_preprocessed.csv"
 
+# Memory-mapped ESM-1v embeddings keyed by mutation_id, with wild-type embeddings
+# keyed by (gene_id, position), written by preprocessing
+EMBEDDING_STORE_DIR = "data/domainome_embeddings/"
+INFERENCE_EMBEDDING_STORE_DIR = "data/non_domainome_embeddings/"
+
 MODEL_PATH = "models/lgbm_model.pkl"
+ENCODER_PATH = "models/feature_encoder.json"
 BEST_PARAMS_PATH = "models/best_params.json"
 OUTPUT_DIR = "results/"
 
 # Parameters
 MASK_RATIO = 0.3
+# Genes bound to the :gene_ids parameter of the extraction queries, for the
+# training set and for the inference set (INFERENCE_DATA_PATH and
+# INFERENCE_EMBEDDING_STORE_DIR; empty skips it)
+GENE_IDS = DOMAINOME_GENE_IDS
+INFERENCE_GENE_IDS = NON_DOMAINOME_GENE_IDS
+# Concurrent extraction queries, each on its own pooled connection, and the
+# number of genes per query (None sends all genes in one query)
+EXTRACT_N_JOBS = 4
+EXTRACT_GENES_PER_QUERY = 8
+# Rows per server-side cursor batch; None extracts the whole query in memory,
+# an integer streams it gene by gene into shards under PROCESSED_SHARDS_DIR
+EXTRACT_BATCH_SIZE = None
+# Worker processes for preprocessing; genes are processed independently
+PREPROCESS_N_JOBS = 1
+# Only re-extract and re-encode genes whose fingerprint changed since the last
+# run, merging them into PROCESSED_DATA_PATH (takes precedence over streaming)
+INCREMENTAL_PREPROCESSING = False
+# Runners read the shards of a streaming run, otherwise the single dataset
+DATA_PATH = (
+    PROCESSED_SHARDS_DIR
+    if EXTRACT_BATCH_SIZE and not INCREMENTAL_PREPROCESSING
+    else PROCESSED_DATA_PATH
+)
+# Also write one file per gene under GENE_PARTITIONS_DIR; per-protein runners
+# then read a single gene at a time
+PARTITION_BY_GENE = False
+PER_PROTEIN_DATA_PATH = GENE_PARTITIONS_DIR if PARTITION_BY_GENE else DATA_PATH
 
 # Ensure required directories exist
 for path in [
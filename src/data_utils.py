@@ -1,16 +1,291 @@
+import os
+import glob
+import json
+from functools import lru_cache
 import pandas as pd
 import numpy as np
-import json
-from sqlalchemy import create_engine
+import pyarrow.parquet as pq
+from joblib import Parallel, delayed
+from sqlalchemy import create_engine, text, bindparam
+
+# ESM-1v per-residue representation size
+EMBEDDING_DIM = 1280
+
+# Identifier and target columns every runner needs next to the features
+KEY_COLUMNS = ["gene_id", "mutation_id", "position", "normalized_dms_score"]
+PARTITION_MANIFEST = "manifest.json"
+# Score columns computed by add_score_summaries, or by the *_scores.sql queries
+SCORE_SUMMARY_COLUMNS = [
+    "normalized_dms_score",
+    "jse_normalized_dms",
+    "mean_normalized_dms",
+]
+# Embedding store levels: file name of the parts, of their row keys and of the
+# column list. Wild-type embeddings are stored once per (gene_id, position).
+STORE_LEVELS = {
+    "mutation": ("embeddings", "mutation_ids", "columns.json"),
+    "position": ("position_embeddings", "position_keys", "position_columns.json"),
+}
+EMBEDDING_PREFIXES = ("wt_embedding_", "variant_embedding_", "diff_embedding_")
+RAW_EMBEDDING_PREFIXES = {
+    "embedding_wt": "wt_",
+    "embedding_variant": "variant_",
+    "embedding_difference": "diff_",
+}
+# Byte layout of embeddings stored as bytea, see db.config.EMBEDDING_DTYPE
+EMBEDDING_BYTES_DTYPE = ">f4"
+
+# Categorical columns and the prefixes of their one-hot encodings
+CATEGORICAL_PREFIXES = {
+    "assay_type": "assay",
+    "eve_class_75_set": "eve_class",
+    "alphafold_conf_type": "alphafold",
+    "mutation_type": "mutation_type",
+}
+
+# Amino acid properties of the wild-type and variant residues
+AA_CATEGORICAL_PROPS = ["chemical", "charge", "stabilizing_interaction", "volume"]
+AA_BOOLEAN_PROPS = [
+    "h_bond_donor",
+    "h_bond_acceptor",
+    "solvent_accessible",
+    "redox_reactivity",
+    "amphipathic",
+    "polar",
+    "hydrophobic",
+]
+AA_NUMERIC_PROPS = [
+    "molecular_weight_da",
+    "pka25_co2h",
+    "pka25_nh2",
+    "isoelectric_point_pl",
+    "hydropathy_index",
+]
+
+ONE_HOT_PREFIXES = tuple(
+    f"{prefix}_" for prefix in CATEGORICAL_PREFIXES.values()
+) + tuple(
+    f"{side}_{prop}_" for prop in AA_CATEGORICAL_PROPS for side in ["wt", "variant"]
+)
+FLAG_COLUMNS = {
+    col
+    for prop in AA_BOOLEAN_PROPS
+    for col in [f"wt_{prop}", f"variant_{prop}", f"{prop}_diff"]
+}
+
+# Storage dtype of each column group in processed datasets
+DTYPE_PLAN = {
+    "key": "int32",
+    "embedding": "float32",
+    "one_hot": "int8",
+    "flag": "int8",
+    "count": "int16",
+    "continuous": "float32",
+}
+
+
+def list_shards(data_path: str) -> list:
+    """Return the Parquet shard files of a sharded dataset directory."""
+    return sorted(glob.glob(os.path.join(data_path, "part-*.parquet")))
+
+
+def read_columns(data_path: str) -> list:
+    """Return the column names of a dataset without loading its rows.
+
+    The columns of a gene-partitioned or sharded dataset are put in the order
+    ``concat_processed`` gives them.
+    """
+    if os.path.exists(os.path.join(data_path, PARTITION_MANIFEST)):
+        return order_columns(read_manifest(data_path)["columns"])
+    if os.path.isdir(data_path):
+        columns = {}
+        for shard in list_shards(data_path):
+            columns.update(dict.fromkeys(pq.read_schema(shard).names))
+        return order_columns(list(columns))
+    if data_path.endswith(".parquet"):
+        return pq.read_schema(data_path).names
+    return pd.read_csv(data_path, nrows=0).columns.tolist()
+
+
+def load_data(data_path: str, mode: str = None, columns: list = None) -> pd.DataFrame:
+    """Load a processed dataset from Parquet, CSV or a directory of shards or genes.
+
+    With ``mode`` set, only the key columns, the features ``set_features(mode=...)``
+    keeps and any extra ``columns`` are read.
+    """
+    if mode is not None:
+        columns = project_columns(read_columns(data_path), mode, columns)
+    if os.path.exists(os.path.join(data_path, PARTITION_MANIFEST)):
+        genes = [gene_data for _, gene_data in iter_genes(data_path, columns=columns)]
+        return concat_processed(genes)
+    if os.path.isdir(data_path):
+        return load_shards(data_path, columns)
+    if data_path.endswith(".parquet"):
+        return pd.read_parquet(data_path, columns=columns)
+    return apply_dtype_plan(pd.read_csv(data_path, usecols=columns))
+
+
+def project_columns(available: list, mode: str, columns: list = None) -> list:
+    """Return the key columns, the features kept by ``mode`` and extra ``columns``."""
+    wanted = set(KEY_COLUMNS + (columns or []))
+    return list(
+        dict.fromkeys(
+            [col for col in available if col in wanted]
+            + feature_columns(available, mode)
+        )
+    )
+
+
+def load_shards(data_path: str, columns: list = None) -> pd.DataFrame:
+    """Concatenate the shards of a streamed dataset.
+
+    Shards are encoded independently, so a one-hot column only exists in the
+    shards where its category occurs; it is filled with 0 everywhere else.
+    """
+    if columns is None:
+        columns = read_columns(data_path)
+    shards = []
+    for shard in list_shards(data_path):
+        present = set(pq.read_schema(shard).names)
+        shards.append(
+            pd.read_parquet(shard, columns=[col for col in columns if col in present])
+        )
+    data = concat_processed(shards).reindex(columns=columns, fill_value=0)
+    return apply_dtype_plan(data)
+
+
+def category_key(category: str) -> tuple:
+    """Sort numeric categories by value and the rest by name, as ``pd.get_dummies``."""
+    try:
+        return (0, float(category), "")
+    except ValueError:
+        return (1, 0.0, category)
+
+
+def order_columns(columns: list) -> list:
+    """Group the one-hot columns of each prefix where the prefix first appears,
+    sorted by category, so the layout does not depend on which frame first shows
+    a category."""
+    prefixes = sorted(ONE_HOT_PREFIXES, key=len, reverse=True)
+    groups = {}
+    for col in columns:
+        prefix = next((p for p in prefixes if col.startswith(p)), None)
+        groups.setdefault(prefix or col, []).append(col)
+    ordered = []
+    for key, group in groups.items():
+        if key in ONE_HOT_PREFIXES:
+            group = sorted(group, key=lambda col: category_key(col[len(key) :]))
+        ordered.extend(group)
+    return ordered
+
+
+def concat_processed(frames: list) -> pd.DataFrame:
+    """Concatenate independently preprocessed frames.
+
+    One-hot columns missing from a frame are filled with 0, sorted by category
+    within their prefix, and the dtype plan is reapplied to the result.
+    """
+    data = pd.concat(frames, ignore_index=True)
+    data = data[order_columns(data.columns)]
+    one_hots = [col for col in data.columns if column_group(col) == "one_hot"]
+    data[one_hots] = data[one_hots].fillna(0)
+    return apply_dtype_plan(data)
+
+
+def read_manifest(partition_dir: str) -> dict:
+    """Return the manifest of a gene-partitioned dataset."""
+    with open(os.path.join(partition_dir, PARTITION_MANIFEST), "r") as f:
+        return json.load(f)
+
+
+def save_gene_partitions(data: pd.DataFrame, partition_dir: str) -> None:
+    """Write one Parquet file per gene_id and record the genes in the manifest.
+
+    Genes already in the manifest are replaced, others are kept.
+    """
+    os.makedirs(partition_dir, exist_ok=True)
+    manifest = {"columns": [], "genes": {}}
+    if os.path.exists(os.path.join(partition_dir, PARTITION_MANIFEST)):
+        manifest = read_manifest(partition_dir)
+
+    for gene_id, gene_data in data.groupby("gene_id", sort=True):
+        path = f"gene_{gene_id}.parquet"
+        save_data(gene_data, os.path.join(partition_dir, path))
+        manifest["genes"][str(gene_id)] = {"path": path, "n_rows": len(gene_data)}
+    manifest["columns"] = list(dict.fromkeys(manifest["columns"] + list(data.columns)))
+
+    with open(os.path.join(partition_dir, PARTITION_MANIFEST), "w") as f:
+        json.dump(manifest, f)
+
+
+def drop_gene_partitions(partition_dir: str, gene_ids) -> None:
+    """Remove genes from a gene-partitioned dataset."""
+    manifest = read_manifest(partition_dir)
+    for gene_id in gene_ids:
+        entry = manifest["genes"].pop(str(gene_id), None)
+        if entry is not None:
+            os.remove(os.path.join(partition_dir, entry["path"]))
+    with open(os.path.join(partition_dir, PARTITION_MANIFEST), "w") as f:
+        json.dump(manifest, f)
+
+
+def load_gene(
+    partition_dir: str,
+    gene_id: int,
+    mode: str = None,
+    columns: list = None,
+    manifest: dict = None,
+) -> pd.DataFrame:
+    """Load the rows of one gene from a gene-partitioned dataset.
+
+    Columns follow the manifest, so one-hot columns absent from this gene's file
+    are filled with 0.
+    """
+    if manifest is None:
+        manifest = read_manifest(partition_dir)
+    path = os.path.join(partition_dir, manifest["genes"][str(gene_id)]["path"])
+    if mode is not None:
+        columns = project_columns(manifest["columns"], mode, columns)
+    elif columns is None:
+        columns = manifest["columns"]
+    present = set(pq.read_schema(path).names)
+    gene_data = pd.read_parquet(
+        path, columns=[col for col in columns if col in present]
+    )
+    return apply_dtype_plan(gene_data.reindex(columns=columns, fill_value=0))
+
+
+def iter_genes(data_path: str, mode: str = None, columns: list = None):
+    """Yield ``(gene_id, gene_data)`` for every gene of a dataset.
+
+    Gene-partitioned datasets are read one gene at a time; any other dataset is
+    loaded once and split by gene_id in a single pass.
+    """
+    if os.path.exists(os.path.join(data_path, PARTITION_MANIFEST)):
+        manifest = read_manifest(data_path)
+        for gene_id in manifest["genes"]:
+            yield int(gene_id), load_gene(
+                data_path, gene_id, mode, columns, manifest=manifest
+            )
+        return
+
+    data = load_data(data_path, mode, columns)
+    for gene_id, gene_data in data.groupby("gene_id", sort=False):
+        yield gene_id, gene_data
 
 
-def load_data(data_path: str) -> pd.DataFrame:
-    return pd.read_csv(data_path)
+def save_data(data: pd.DataFrame, data_path: str) -> None:
+    """Write a dataset as zstd-compressed Parquet or as CSV, based on the extension."""
+    if data_path.endswith(".parquet"):
+        data.to_parquet(data_path, index=False, compression="zstd")
+    else:
+        data.to_csv(data_path, index=False)
 
 
-def set_features(data: pd.DataFrame, mode: str = "drop") -> pd.DataFrame:
+def feature_columns(columns: list, mode: str = "drop") -> list:
+    """Return the feature columns ``set_features`` keeps out of ``columns``."""
     if mode == "drop":
-        features_to_drop = [
+        features_to_drop = {
             "mutation_id",
             "position",
             "normalized_dms_score",
@@ -19,40 +294,424 @@ def set_features(data: pd.DataFrame, mode: str = "drop") -> pd.DataFrame:
             "eve_class_Uncertain",
             "eve_class_Pathogenic",
             "eve_class_Benign",
-        ] + [
+        }
+        dropped_prefixes = (
+            "alphafold_",
+            "alphamissense_",
+            "assay_",
+            "mutation_type_",
+            "diff_embedding_",
+        )
+        return [
             col
-            for col in data.columns
-            if col.startswith(
-                (
-                    "alphafold_",
-                    "alphamissense_",
-                    "assay_",
-                    "mutation_type_",
-                    "diff_embedding_",
-                )
-            )
+            for col in columns
+            if col not in features_to_drop and not col.startswith(dropped_prefixes)
         ]
-        return data.drop(columns=features_to_drop, errors="ignore")
 
     elif mode == "select":
-        selected = ["mean_normalized_dms"] + [
-            col
-            for col in data.columns
-            if col.startswith(
-                ("wt_embedding_", "variant_embedding_", "diff_embedding_")
-            )
+        return ["mean_normalized_dms"] + [
+            col for col in columns if col.startswith(EMBEDDING_PREFIXES)
         ]
-        return data[selected]
 
     raise ValueError("Invalid mode. Use 'drop' or 'select'")
 
 
-def fetch_data(query_path: str, db_url: str) -> pd.DataFrame:
+def set_features(
+    data: pd.DataFrame, mode: str = "drop", embedding_store: str = None
+) -> pd.DataFrame:
+    """Select the model features of ``data``.
+
+    If ``data`` carries no embedding columns and ``embedding_store`` is given, the
+    embedding features kept by ``mode`` are joined from the store by mutation_id.
+    """
+    features = data[feature_columns(data.columns, mode)]
+    if embedding_store is None or any(
+        col.startswith(EMBEDDING_PREFIXES) for col in data.columns
+    ):
+        return features
+    return pd.concat([features, join_embeddings(data, embedding_store, mode)], axis=1)
+
+
+def write_store_part(
+    block: np.ndarray,
+    keys: np.ndarray,
+    columns: list,
+    store_dir: str,
+    level: str,
+    part: int,
+) -> None:
+    """Write one part of an embedding store level as a float32 ``.npy`` matrix, its
+    row keys and the level's column names."""
+    embeddings_name, keys_name, columns_name = STORE_LEVELS[level]
+    os.makedirs(store_dir, exist_ok=True)
+    embeddings = np.lib.format.open_memmap(
+        os.path.join(store_dir, f"{embeddings_name}-{part:05d}.npy"),
+        mode="w+",
+        dtype=np.float32,
+        shape=block.shape,
+    )
+    embeddings[:] = block
+    embeddings.flush()
+    np.save(os.path.join(store_dir, f"{keys_name}-{part:05d}.npy"), keys)
+    with open(os.path.join(store_dir, columns_name), "w") as f:
+        json.dump(columns, f)
+
+
+def write_embedding_store(
+    data: pd.DataFrame, store_dir: str, part: int = 0
+) -> pd.DataFrame:
+    """Move the embedding columns of ``data`` into a memory-mappable store.
+
+    Each part is a float32 ``.npy`` matrix with one row per mutation_id, so a
+    mutation with several DMS scores is stored once; the remaining columns of
+    ``data`` are returned.
+    """
+    columns = [col for col in data.columns if col.startswith(EMBEDDING_PREFIXES)]
+    unique = data.drop_duplicates("mutation_id")
+    write_store_part(
+        unique[columns].to_numpy(dtype=np.float32),
+        unique["mutation_id"].to_numpy(),
+        columns,
+        store_dir,
+        "mutation",
+        part,
+    )
+    return data.drop(columns=columns)
+
+
+def position_keys(data: pd.DataFrame) -> np.ndarray:
+    """Pack ``(gene_id, position)`` into one int64 key per row."""
+    return (data["gene_id"].to_numpy(dtype=np.int64) << 32) | data["position"].to_numpy(
+        dtype=np.int64
+    )
+
+
+def write_position_store(
+    positions: pd.DataFrame, store_dir: str, part: int = 0
+) -> None:
+    """Write wild-type embeddings, fetched once per ``(gene_id, position)``, to the
+    position level of an embedding store."""
+    prefix = RAW_EMBEDDING_PREFIXES["embedding_wt"]
+    write_store_part(
+        decode_embeddings(positions["embedding_wt"]),
+        position_keys(positions),
+        [f"{prefix}embedding_{i}" for i in range(EMBEDDING_DIM)],
+        store_dir,
+        "position",
+        part,
+    )
+
+
+@lru_cache(maxsize=None)
+def open_embedding_store(store_dir: str, level: str = "mutation"):
+    """Memory-map every part of one level of an embedding store.
+
+    Returns the embedding column names and a list of ``(keys, embeddings)`` pairs,
+    where ``keys`` is an index into the rows of ``embeddings``. A level that was
+    never written has no columns and no parts.
+    """
+    embeddings_name, keys_name, columns_name = STORE_LEVELS[level]
+    if not os.path.exists(os.path.join(store_dir, columns_name)):
+        return [], []
+    with open(os.path.join(store_dir, columns_name), "r") as f:
+        columns = json.load(f)
+    parts = []
+    pattern = os.path.join(store_dir, f"{embeddings_name}-*.npy")
+    for path in sorted(glob.glob(pattern)):
+        part = path[-len("00000.npy") :]
+        keys = np.load(os.path.join(store_dir, f"{keys_name}-{part}"))
+        parts.append((pd.Index(keys), np.load(path, mmap_mode="r")))
+    return columns, parts
+
+
+def difference_columns(columns: list) -> list:
+    """Return the difference embedding columns derivable from the wild-type and
+    variant embedding columns in ``columns``."""
+    present = set(columns)
+    return [
+        f"diff_embedding_{i}"
+        for i in range(EMBEDDING_DIM)
+        if f"wt_embedding_{i}" in present and f"variant_embedding_{i}" in present
+    ]
+
+
+def join_embeddings(
+    data: pd.DataFrame, store_dir: str, mode: str = "drop", columns: list = None
+) -> pd.DataFrame:
+    """Read the embedding features kept by ``mode``, or the given ``columns``, for
+    the rows of ``data``.
+
+    Wild-type embeddings are broadcast from the position level of the store by
+    ``(gene_id, position)``; the rest are looked up by mutation_id. Difference
+    embeddings missing from the store are derived as variant minus wild-type, only
+    when requested. Rows missing from the store get NaN embeddings; a directory
+    without a store raises FileNotFoundError.
+    """
+    if not os.path.exists(os.path.join(store_dir, STORE_LEVELS["mutation"][2])):
+        raise FileNotFoundError(f"No embedding store in {store_dir}")
+    mutation_columns = open_embedding_store(store_dir, "mutation")[0]
+    position_columns = [
+        col
+        for col in open_embedding_store(store_dir, "position")[0]
+        if col not in set(mutation_columns)
+    ]
+    available = position_columns + mutation_columns
+    derived = []
+    if not any(col.startswith("diff_embedding_") for col in available):
+        derived = difference_columns(available)
+    kept = set(
+        feature_columns(available + derived, mode) if columns is None else columns
+    )
+
+    # Wild-type and variant embeddings needed to derive the requested differences
+    dims = np.array([int(col.split("_")[-1]) for col in derived if col in kept])
+    needed = kept | {
+        f"{side}_embedding_{i}" for i in dims for side in ["wt", "variant"]
+    }
+
+    blocks = []
+    for level, level_columns in [
+        ("position", set(position_columns)),
+        ("mutation", set(mutation_columns)),
+    ]:
+        store_columns, parts = open_embedding_store(store_dir, level)
+        wanted = [
+            i
+            for i, col in enumerate(store_columns)
+            if col in needed and col in level_columns
+        ]
+        if not wanted:
+            continue
+
+        keys = (
+            position_keys(data)
+            if level == "position"
+            else data["mutation_id"].to_numpy()
+        )
+        block = np.full((len(data), len(wanted)), np.nan, dtype=np.float32)
+        for index, embeddings in parts:
+            rows = index.get_indexer(keys)
+            found = rows >= 0
+            if found.any():
+                block[found] = embeddings[np.ix_(rows[found], wanted)]
+        blocks.append(
+            pd.DataFrame(
+                block, index=data.index, columns=[store_columns[i] for i in wanted]
+            )
+        )
+
+    if len(dims):
+        joined = pd.concat(blocks, axis=1)
+        wt = joined[[f"wt_embedding_{i}" for i in dims]].to_numpy()
+        variant = joined[[f"variant_embedding_{i}" for i in dims]].to_numpy()
+        blocks.append(
+            pd.DataFrame(
+                variant - wt,
+                index=data.index,
+                columns=[f"diff_embedding_{i}" for i in dims],
+            )
+        )
+    if not blocks:
+        return pd.DataFrame(index=data.index)
+    joined = pd.concat(blocks, axis=1)
+    return joined[[col for col in available + derived if col in kept]]
+
+
+def column_group(col: str) -> str:
+    """Return the ``DTYPE_PLAN`` group of a processed column."""
+    if col in ("gene_id", "mutation_id", "position"):
+        return "key"
+    if col.startswith(EMBEDDING_PREFIXES):
+        return "embedding"
+    if col.startswith(ONE_HOT_PREFIXES):
+        return "one_hot"
+    if col in FLAG_COLUMNS:
+        return "flag"
+    if col == "edit_distance":
+        return "count"
+    return "continuous"
+
+
+def apply_dtype_plan(data: pd.DataFrame) -> pd.DataFrame:
+    """Cast every column to the dtype ``DTYPE_PLAN`` declares for its group."""
+    dtypes = {col: DTYPE_PLAN[column_group(col)] for col in data.columns}
+    changed = {col: dtype for col, dtype in dtypes.items() if data[col].dtype != dtype}
+    return data.astype(changed) if changed else data
+
+
+def dtype_memory_report(data: pd.DataFrame) -> pd.DataFrame:
+    """Summarise memory per column group under the dtype plan against 64-bit columns."""
+    report = (
+        pd.DataFrame(
+            {
+                "group": [column_group(col) for col in data.columns],
+                "n_columns": 1,
+                "bytes_64bit": len(data) * 8,
+                "bytes": data.memory_usage(index=False).to_numpy(),
+            }
+        )
+        .groupby("group")
+        .sum()
+    )
+    report["saved_mb"] = (report["bytes_64bit"] - report["bytes"]) / 2**20
+    return report
+
+
+def as_subquery(query: str) -> str:
+    """Strip the trailing semicolon so a query can be wrapped in an outer SELECT."""
+    return query.strip().rstrip(";")
+
+
+def read_binary_embeddings(data: pd.DataFrame) -> pd.DataFrame:
+    """Decode packed float32 ``bytea`` embedding columns into NumPy arrays."""
+    for col in RAW_EMBEDDING_PREFIXES:
+        if col in data.columns:
+            data[col] = pd.Series(
+                [
+                    (
+                        np.frombuffer(value, dtype=EMBEDDING_BYTES_DTYPE)
+                        if isinstance(value, (bytes, memoryview))
+                        else value
+                    )
+                    for value in data[col].to_numpy()
+                ],
+                index=data.index,
+                dtype=object,
+            )
+    return data
+
+
+@lru_cache(maxsize=None)
+def get_engine(db_url: str, pool_size: int = 1):
+    """Return a shared engine holding up to ``pool_size`` pooled connections."""
+    return create_engine(db_url, pool_size=pool_size, max_overflow=0)
+
+
+def gene_query(query: str):
+    """Build a text clause whose ``:gene_ids`` parameter expands to an IN list."""
+    clause = text(query)
+    if ":gene_ids" in query:
+        clause = clause.bindparams(bindparam("gene_ids", expanding=True))
+    return clause
+
+
+def gene_batches(gene_ids: list, genes_per_query: int = None) -> list:
+    """Split sorted, de-duplicated gene ids into batches of ``genes_per_query``."""
+    gene_ids = sorted({int(gene_id) for gene_id in gene_ids})
+    size = genes_per_query or max(len(gene_ids), 1)
+    return [gene_ids[i : i + size] for i in range(0, len(gene_ids), size)] or [[]]
+
+
+def read_gene_batches(
+    query: str,
+    db_url: str,
+    gene_ids: list = None,
+    n_jobs: int = 1,
+    genes_per_query: int = None,
+) -> pd.DataFrame:
+    """Run ``query`` once per batch of genes on up to ``n_jobs`` pooled connections.
+
+    Batches are concatenated in gene order, so the result does not depend on
+    which query finishes first. A query without ``:gene_ids`` runs once.
+    """
+    engine = get_engine(db_url, n_jobs)
+    clause = gene_query(query)
+    if ":gene_ids" not in query:
+        with engine.connect() as conn:
+            return pd.read_sql(clause, conn)
+    if gene_ids is None:
+        raise ValueError("gene_ids are required by a query with a :gene_ids parameter")
+
+    def read_batch(batch):
+        with engine.connect() as conn:
+            return pd.read_sql(clause, conn, params={"gene_ids": batch})
+
+    frames = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(read_batch)(batch) for batch in gene_batches(gene_ids, genes_per_query)
+    )
+    return pd.concat(frames, ignore_index=True)
+
+
+def fetch_data(
+    query_path: str,
+    db_url: str,
+    gene_ids: list = None,
+    n_jobs: int = 1,
+    genes_per_query: int = None,
+) -> pd.DataFrame:
+    """Extract the rows of ``gene_ids``, querying batches of genes concurrently."""
+    with open(query_path, "r") as file:
+        query = file.read()
+    return read_binary_embeddings(
+        read_gene_batches(query, db_url, gene_ids, n_jobs, genes_per_query)
+    )
+
+
+def fetch_fingerprints(
+    query_path: str,
+    db_url: str,
+    gene_ids: list,
+    n_jobs: int = 1,
+    genes_per_query: int = None,
+) -> dict:
+    """Fingerprint every gene returned by the extraction query.
+
+    A gene's fingerprint changes when its rows are added or removed, its scores
+    are re-computed or its ``dms_range`` bounds are updated. NaN scores are left
+    out of the sum and missing values are stored as None, so fingerprints of
+    unchanged genes compare equal across runs.
+    """
     with open(query_path, "r") as file:
         query = file.read()
-    engine = create_engine(db_url)
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
+    query = f"""
+        SELECT
+            gene_id,
+            COUNT(*) AS n_rows,
+            MAX(mutation_id) AS max_mutation_id,
+            ROUND(SUM(NULLIF(dms_score, 'NaN'))::numeric, 6) AS dms_score_sum,
+            MAX(wt_score) AS wt_score,
+            MAX(non_score) AS non_score
+        FROM ({as_subquery(query)}) AS extract
+        GROUP BY gene_id
+    """
+    fingerprints = read_gene_batches(
+        query, db_url, gene_ids, n_jobs, genes_per_query
+    ).set_index("gene_id")
+    return {
+        int(gene_id): [None if pd.isna(value) else float(value) for value in row]
+        for gene_id, row in fingerprints.iterrows()
+    }
+
+
+def stream_data(query_path: str, db_url: str, gene_ids: list, batch_size: int):
+    """Yield the query result through a server-side cursor in batches of whole genes.
+
+    The query must be ordered by gene_id. Rows of the last gene in a batch are
+    held back until that gene is complete, so gene-level statistics stay exact.
+    """
+    with open(query_path, "r") as file:
+        query = file.read()
+    engine = get_engine(db_url)
+    with engine.connect().execution_options(
+        stream_results=True, max_row_buffer=batch_size
+    ) as conn:
+        pending = None
+        chunks = pd.read_sql(
+            gene_query(query),
+            conn,
+            params={"gene_ids": sorted({int(gene_id) for gene_id in gene_ids})},
+            chunksize=batch_size,
+        )
+        for chunk in chunks:
+            chunk = read_binary_embeddings(chunk)
+            if pending is not None:
+                chunk = pd.concat([pending, chunk], ignore_index=True)
+            complete = chunk["gene_id"] != chunk["gene_id"].iloc[-1]
+            pending = chunk[~complete]
+            if complete.any():
+                yield chunk[complete].reset_index(drop=True)
+        if pending is not None and not pending.empty:
+            yield pending.reset_index(drop=True)
 
 
 def normalize_dms_scores(data: pd.DataFrame) -> pd.DataFrame:
@@ -62,79 +721,130 @@ def normalize_dms_scores(data: pd.DataFrame) -> pd.DataFrame:
     return data
 
 
-def compute_jse(scores: pd.Series) -> pd.Series:
-    mu = scores.mean()
-    var = scores.var(ddof=1)
-    n = len(scores)
-    if var == 0 or n <= 2:
-        return pd.Series(mu, index=scores.index)
-    shrink = max(0, 1 - (n - 2) * var / ((scores - mu) ** 2).sum())
-    return pd.Series(mu + shrink * (scores - mu), index=scores.index)
+def segment_statistics(values: np.ndarray, starts: np.ndarray) -> tuple:
+    """Return the length, non-NaN count, mean and sum of squared deviations of each
+    segment of ``values``, where segments begin at the sorted offsets ``starts``."""
+    valid = ~np.isnan(values)
+    lengths = np.diff(np.append(starts, len(values)))
+    count = np.add.reduceat(valid.astype(np.int64), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.add.reduceat(np.where(valid, values, 0.0), starts) / count
+    deviation = np.where(valid, values - np.repeat(mean, lengths), 0.0)
+    return lengths, count, mean, np.add.reduceat(deviation**2, starts)
 
 
-def compute_mean_per_position(data: pd.DataFrame) -> pd.DataFrame:
+def compute_group_statistics(data: pd.DataFrame) -> pd.DataFrame:
+    """Compute per-gene and per-(gene, position) score statistics in one sorted pass.
+
+    Returns, aligned with ``data``, the gene-level count, mean, unbiased variance,
+    sum of squared deviations and James-Stein shrinkage factor, the resulting
+    JSE-shrunk scores and the per-position mean score.
+    """
     if not {"gene_id", "position", "normalized_dms_score"}.issubset(data.columns):
         raise ValueError("Missing columns for position-level aggregation")
-    data["mean_normalized_dms"] = data.groupby(["gene_id", "position"])[
-        "normalized_dms_score"
-    ].transform("mean")
-    return data
+    columns = [
+        "gene_count",
+        "gene_mean",
+        "gene_var",
+        "gene_ss",
+        "gene_shrink",
+        "jse_normalized_dms",
+        "mean_normalized_dms",
+    ]
+    if data.empty:
+        return pd.DataFrame(index=data.index, columns=columns, dtype=np.float64)
 
+    genes = data["gene_id"].to_numpy()
+    positions = data["position"].to_numpy()
+    order = np.lexsort((positions, genes))
+    genes, positions = genes[order], positions[order]
+    scores = data["normalized_dms_score"].to_numpy(dtype=np.float64)[order]
 
-def flatten_embedding(embedding):
-    if isinstance(embedding, str):
-        try:
-            embedding = json.loads(embedding)
-        except json.JSONDecodeError:
-            return pd.Series()
-    if isinstance(embedding, (list, np.ndarray)):
-        return pd.Series(
-            embedding, index=[f"embedding_{i}" for i in range(len(embedding))]
-        )
-    return pd.Series(dtype="float64")
+    new_gene = np.r_[True, genes[1:] != genes[:-1]]
+    new_position = new_gene | np.r_[True, positions[1:] != positions[:-1]]
 
+    # Gene-level aggregates and James-Stein shrinkage
+    n, count, mean, ss = segment_statistics(scores, np.flatnonzero(new_gene))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = ss / (count - 1)
+        shrink = 1 - (n - 2) * var / ss
+    shrink = np.where(np.isnan(shrink), 0.0, np.maximum(shrink, 0.0))
+    constant = (var == 0) | (n <= 2)
 
-def preprocess(data: pd.DataFrame) -> pd.DataFrame:
-    # Normalize and compute score summaries
+    stats = {
+        "gene_count": n,
+        "gene_mean": mean,
+        "gene_var": var,
+        "gene_ss": ss,
+        "gene_shrink": shrink,
+    }
+    stats = {key: np.repeat(value, n) for key, value in stats.items()}
+    stats["jse_normalized_dms"] = np.where(
+        np.repeat(constant, n),
+        stats["gene_mean"],
+        stats["gene_mean"] + stats["gene_shrink"] * (scores - stats["gene_mean"]),
+    )
+
+    # Position-level mean
+    lengths, _, position_mean, _ = segment_statistics(
+        scores, np.flatnonzero(new_position)
+    )
+    stats["mean_normalized_dms"] = np.repeat(position_mean, lengths)
+
+    # Broadcast back to the original row order
+    result = np.empty((len(order), len(columns)))
+    result[order] = np.column_stack([stats[col] for col in columns])
+    return pd.DataFrame(result, index=data.index, columns=columns)
+
+
+def decode_embeddings(embeddings: pd.Series, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Decode a column of JSON, list or array embeddings into one (n_rows x dim)
+    float32 array.
+
+    Rows with a missing, malformed or wrongly sized embedding are left as NaN.
+    """
+    block = np.full((len(embeddings), dim), np.nan, dtype=np.float32)
+    for i, embedding in enumerate(embeddings.to_numpy()):
+        if isinstance(embedding, str):
+            values = np.fromstring(embedding.strip()[1:-1], dtype=np.float32, sep=",")
+        elif isinstance(embedding, (list, np.ndarray)):
+            values = np.asarray(embedding, dtype=np.float32)
+        else:
+            continue
+        if values.shape == (dim,):
+            block[i] = values
+    return block
+
+
+def add_score_summaries(data: pd.DataFrame) -> pd.DataFrame:
+    """Normalize DMS scores and add the per-gene JSE and per-position means.
+
+    Rows extracted with the SQL score summaries already carry them and are
+    returned unchanged.
+    """
+    if set(SCORE_SUMMARY_COLUMNS).issubset(data.columns):
+        return data
     data = normalize_dms_scores(data)
-    data["jse_normalized_dms"] = data.groupby("gene_id")[
-        "normalized_dms_score"
-    ].transform(compute_jse)
-    data = compute_mean_per_position(data)
+    stats = compute_group_statistics(data)
+    data["jse_normalized_dms"] = stats["jse_normalized_dms"]
+    data["mean_normalized_dms"] = stats["mean_normalized_dms"]
+    return data
 
-    # One-hot encode categorical features
-    cat_cols = [
-        "assay_type",
-        "eve_class_75_set",
-        "alphafold_conf_type",
-        "mutation_type",
-    ]
-    prefixes = {
-        "assay_type": "assay",
-        "eve_class_75_set": "eve_class",
-        "alphafold_conf_type": "alphafold",
-        "mutation_type": "mutation_type",
-    }
-    data = pd.get_dummies(data, columns=cat_cols, prefix=prefixes)
 
-    # Encode amino acid categorical features
-    for prop in ["chemical", "charge", "stabilizing_interaction", "volume"]:
+def encode_aa_categories(data: pd.DataFrame) -> pd.DataFrame:
+    """One-hot encode the categorical amino acid properties of both residues."""
+    for prop in AA_CATEGORICAL_PROPS:
         for prefix in ["wt", "variant"]:
             col = f"{prefix}_{prop}"
             if col in data.columns:
                 data = pd.get_dummies(data, columns=[col], prefix=[col])
+    return data
+
 
+def add_property_features(data: pd.DataFrame) -> pd.DataFrame:
+    """Encode boolean amino acid properties and add wt/variant property differences."""
     # Encode boolean amino acid features and compute differences
-    bool_props = [
-        "h_bond_donor",
-        "h_bond_acceptor",
-        "solvent_accessible",
-        "redox_reactivity",
-        "amphipathic",
-        "polar",
-        "hydrophobic",
-    ]
-    for prop in bool_props:
+    for prop in AA_BOOLEAN_PROPS:
         wt, var = f"wt_{prop}", f"variant_{prop}"
         if wt in data.columns and var in data.columns:
             data[wt] = data[wt].astype(int)
@@ -142,34 +852,99 @@ def preprocess(data: pd.DataFrame) -> pd.DataFrame:
             data[f"{prop}_diff"] = abs(data[wt] - data[var])
 
     # Compute numeric property differences
-    num_props = [
-        "molecular_weight_da",
-        "pka25_co2h",
-        "pka25_nh2",
-        "isoelectric_point_pl",
-        "hydropathy_index",
-    ]
-    for prop in num_props:
+    for prop in AA_NUMERIC_PROPS:
         wt, var = f"wt_{prop}", f"variant_{prop}"
         if wt in data.columns and var in data.columns:
             data[f"{prop}_diff"] = abs(data[wt] - data[var])
 
     # Process edit_distance
     data["edit_distance"] = (
-        pd.to_numeric(data.get("edit_distance", 0), errors="coerce")
+        pd.to_numeric(
+            data.get("edit_distance", pd.Series(0, index=data.index)), errors="coerce"
+        )
         .fillna(0)
         .astype(int)
     )
+    return data
 
-    # Flatten and rename embedding columns
-    for col, prefix in [
-        ("embedding_wt", "wt_"),
-        ("embedding_variant", "variant_"),
-        ("embedding_difference", "diff_"),
-    ]:
+
+def build_pair_tensor(pairs: pd.DataFrame) -> tuple:
+    """Encode the residue-pair table into an (n_residues x n_residues x n_features)
+    float32 tensor.
+
+    Returns the residue alphabet, the tensor and its feature names. Residues without
+    amino acid properties (e.g. stop codons) get all-zero flags; pairs missing from
+    the table are NaN.
+    """
+    pairs = encode_aa_categories(pairs)
+    for prop in AA_BOOLEAN_PROPS:
+        for prefix in ["wt", "variant"]:
+            col = f"{prefix}_{prop}"
+            if col in pairs.columns:
+                pairs[col] = pairs[col].eq(True)
+    pairs = add_property_features(pairs).drop(columns="edit_distance")
+
+    residues = pd.Index(
+        sorted(set(pairs["wt_residue"]) | set(pairs["variant_residue"]))
+    )
+    columns = [
+        col for col in pairs.columns if col not in ("wt_residue", "variant_residue")
+    ]
+    tensor = np.full(
+        (len(residues), len(residues), len(columns)), np.nan, dtype=np.float32
+    )
+    tensor[
+        residues.get_indexer(pairs["wt_residue"]),
+        residues.get_indexer(pairs["variant_residue"]),
+    ] = pairs[columns].to_numpy(dtype=np.float32)
+    return residues, tensor, columns
+
+
+def gather_pair_features(data: pd.DataFrame, pair_tensor: tuple) -> pd.DataFrame:
+    """Look up the residue-pair features of every row in one fancy-indexing gather."""
+    residues, tensor, columns = pair_tensor
+    wt = residues.get_indexer(data["wt_residue"])
+    variant = residues.get_indexer(data["variant_residue"])
+    block = tensor[wt, variant]
+    block[(wt < 0) | (variant < 0)] = np.nan
+    return pd.DataFrame(block, index=data.index, columns=columns)
+
+
+def preprocess(data: pd.DataFrame, pair_tensor: tuple = None) -> pd.DataFrame:
+    """Turn extracted rows into model-ready features.
+
+    ``pair_tensor`` from ``build_pair_tensor`` supplies the substitution-matrix and
+    amino acid property features; without it they are encoded from the per-row
+    columns of the extract, if present.
+    """
+    # Normalize and compute score summaries
+    data = add_score_summaries(data)
+
+    # One-hot encode categorical features
+    data = pd.get_dummies(
+        data, columns=list(CATEGORICAL_PREFIXES), prefix=CATEGORICAL_PREFIXES
+    )
+
+    # Encode amino acid categorical features
+    data = encode_aa_categories(data)
+
+    data = add_property_features(data)
+
+    # Look up residue-pair features and decode embeddings as contiguous blocks
+    blocks = []
+    if pair_tensor is not None:
+        blocks.append(gather_pair_features(data, pair_tensor))
+    for col, prefix in RAW_EMBEDDING_PREFIXES.items():
         if col in data.columns:
-            flattened = data[col].apply(flatten_embedding)
-            data = pd.concat([data, flattened.add_prefix(prefix)], axis=1)
+            blocks.append(
+                pd.DataFrame(
+                    decode_embeddings(data[col]),
+                    index=data.index,
+                    columns=[f"{prefix}embedding_{i}" for i in range(EMBEDDING_DIM)],
+                )
+            )
+    if blocks:
+        data = pd.concat([data] + blocks, axis=1)
 
     # Drop raw columns
     drop_cols = [
@@ -190,7 +965,22 @@ def preprocess(data: pd.DataFrame) -> pd.DataFrame:
         lambda x: pd.to_numeric(x, errors="coerce").fillna(0).astype(int)
     )
 
-    bool_cols = data.select_dtypes(include="bool").columns
-    data[bool_cols] = data[bool_cols].astype(int)
+    # Store every column group, including boolean one-hots, in its planned dtype
+    return apply_dtype_plan(data)
 
-    return data
+
+def preprocess_by_gene(
+    data: pd.DataFrame, pair_tensor: tuple = None, n_jobs: int = 1
+) -> pd.DataFrame:
+    """Preprocess every gene in its own worker process and stitch the results.
+
+    All score statistics are per gene, so this matches ``preprocess`` on the whole
+    table; one-hot columns are aligned across genes by ``concat_processed``.
+    """
+    if n_jobs == 1:
+        return preprocess(data, pair_tensor)
+    genes = [gene_data for _, gene_data in data.groupby("gene_id", sort=False)]
+    frames = Parallel(n_jobs=n_jobs)(
+        delayed(preprocess)(gene_data, pair_tensor) for gene_data in genes
+    )
+    return concat_processed(frames)
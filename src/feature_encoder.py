@@ -0,0 +1,203 @@
+import json
+import numpy as np
+import pandas as pd
+from src.data_utils import (
+    AA_CATEGORICAL_PROPS,
+    CATEGORICAL_PREFIXES,
+    DTYPE_PLAN,
+    RAW_EMBEDDING_PREFIXES,
+    EMBEDDING_DIM,
+    add_score_summaries,
+    add_property_features,
+    column_group,
+    decode_embeddings,
+    difference_columns,
+    gather_pair_features,
+    join_embeddings,
+)
+
+
+def feature_name(col: str) -> str:
+    """Return ``col`` as LightGBM names features, with spaces replaced by "_"."""
+    return col.replace(" ", "_")
+
+
+class FeatureEncoder:
+    """Schema-locked mapping from raw or processed rows to a model's feature layout.
+
+    The encoder records the exact feature columns, their order and dtypes. One-hot
+    vocabularies are recovered from the column names, so any batch is encoded into
+    the same layout no matter which categories it contains. Columns are matched
+    by their LightGBM feature names, so "wt_volume_Very small" in a batch fills
+    the model's "wt_volume_Very_small".
+    """
+
+    def __init__(self, columns: list, dtypes: dict):
+        self.columns = list(columns)
+        self.dtypes = dict(dtypes)
+        self.positions = {feature_name(col): i for i, col in enumerate(self.columns)}
+
+        # Output positions of each one-hot category, keyed by source column
+        sources = dict(CATEGORICAL_PREFIXES)
+        for prop in AA_CATEGORICAL_PROPS:
+            for prefix in ["wt", "variant"]:
+                sources[f"{prefix}_{prop}"] = f"{prefix}_{prop}"
+        self.vocabularies = {}
+        for source, prefix in sources.items():
+            vocabulary = {
+                col[len(prefix) + 1 :]: i
+                for col, i in self.positions.items()
+                if col.startswith(f"{prefix}_") and column_group(col) == "one_hot"
+            }
+            if vocabulary:
+                self.vocabularies[source] = vocabulary
+
+        # Output positions of each embedding block
+        self.embeddings = {}
+        for raw_col, prefix in RAW_EMBEDDING_PREFIXES.items():
+            block = [
+                (dim, self.positions[f"{prefix}embedding_{dim}"])
+                for dim in range(EMBEDDING_DIM)
+                if f"{prefix}embedding_{dim}" in self.positions
+            ]
+            if block:
+                self.embeddings[raw_col] = tuple(np.array(x) for x in zip(*block))
+
+    @classmethod
+    def fit(cls, features: pd.DataFrame) -> "FeatureEncoder":
+        """Lock the encoder to the layout of a feature matrix from ``set_features``."""
+        return cls(
+            features.columns,
+            {col: str(dtype) for col, dtype in features.dtypes.items()},
+        )
+
+    @classmethod
+    def from_feature_names(cls, columns: list) -> "FeatureEncoder":
+        """Lock the encoder to a model's feature names, with dtypes from ``DTYPE_PLAN``.
+
+        Used for models trained without a saved encoder, e.g. the published model.
+        """
+        return cls(columns, {col: DTYPE_PLAN[column_group(col)] for col in columns})
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"columns": self.columns, "dtypes": self.dtypes}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureEncoder":
+        with open(path, "r") as f:
+            state = json.load(f)
+        return cls(state["columns"], state["dtypes"])
+
+    def transform(
+        self, data: pd.DataFrame, embedding_store: str = None, pair_tensor: tuple = None
+    ) -> pd.DataFrame:
+        """Encode a batch of raw extract rows or processed rows into the locked layout.
+
+        Columns already present in ``data`` are copied; one-hot columns are encoded
+        from their categorical source column, and embeddings are decoded from the
+        raw JSON columns or joined from ``embedding_store``. Residue-pair features are
+        gathered from ``pair_tensor`` when the batch carries residues. One-hot
+        columns with no source are 0; any other feature without a source raises
+        ValueError.
+        """
+        data = data.copy()
+        if "normalized_dms_score" not in data.columns and "dms_score" in data.columns:
+            data = add_score_summaries(data)
+        data = add_property_features(data)
+        if pair_tensor is not None and "wt_residue" in data.columns:
+            pairs = gather_pair_features(data, pair_tensor)
+            pairs = pairs[pairs.columns.difference(data.columns, sort=False)]
+            data = pd.concat([data, pairs], axis=1)
+        data = data.rename(columns=feature_name)
+        obj_cols = data.select_dtypes(include="object").columns.difference(
+            list(self.vocabularies) + list(RAW_EMBEDDING_PREFIXES)
+        )
+        data[obj_cols] = data[obj_cols].apply(
+            lambda x: pd.to_numeric(x, errors="coerce").fillna(0).astype(int)
+        )
+
+        matrix = np.full((len(data), len(self.columns)), np.nan, dtype=np.float32)
+        filled = np.zeros(len(self.columns), dtype=bool)
+
+        # Features already computed for this batch
+        present = [col for col in self.positions if col in data.columns]
+        if present:
+            idx = [self.positions[col] for col in present]
+            matrix[:, idx] = data[present].to_numpy(dtype=np.float32)
+            filled[idx] = True
+
+        # One-hot features from categorical codes
+        rows = np.arange(len(data))
+        for source, vocabulary in self.vocabularies.items():
+            idx = np.array(list(vocabulary.values()))
+            if source in data.columns:
+                codes = pd.Categorical(
+                    data[source].astype(str).map(feature_name),
+                    categories=list(vocabulary),
+                ).codes
+                hit = codes >= 0
+                matrix[:, idx] = 0
+                matrix[rows[hit], idx[codes[hit]]] = 1
+            else:
+                matrix[:, idx[~filled[idx]]] = 0
+            filled[idx] = True
+
+        # Embedding features from raw JSON columns or the embedding store
+        for raw_col, (dims, idx) in self.embeddings.items():
+            if filled[idx].all() or raw_col not in data.columns:
+                continue
+            matrix[:, idx] = decode_embeddings(data[raw_col])[:, dims]
+            filled[idx] = True
+
+        # Difference embeddings derived from decoded wild-type and variant blocks
+        derivable = [
+            col
+            for col in difference_columns(self.columns)
+            if col in self.positions
+            and not filled[self.positions[col]]
+            and filled[self.positions[col.replace("diff_", "wt_")]]
+            and filled[self.positions[col.replace("diff_", "variant_")]]
+        ]
+        if derivable:
+            idx = [self.positions[col] for col in derivable]
+            matrix[:, idx] = (
+                matrix[
+                    :,
+                    [self.positions[c.replace("diff_", "variant_")] for c in derivable],
+                ]
+                - matrix[
+                    :, [self.positions[c.replace("diff_", "wt_")] for c in derivable]
+                ]
+            )
+            filled[idx] = True
+        missing = [col for col, done in zip(self.columns, filled) if not done]
+        if embedding_store is not None and missing:
+            joined = join_embeddings(data, embedding_store, columns=missing)
+            idx = [self.positions[col] for col in joined.columns]
+            matrix[:, idx] = joined.to_numpy()
+            filled[idx] = True
+            missing = [col for col, done in zip(self.columns, filled) if not done]
+        if missing:
+            raise ValueError(
+                f"No source for {len(missing)} features, e.g. {missing[:3]}"
+            )
+
+        # Build one block per dtype, then restore the locked column order
+        blocks = []
+        for dtype in dict.fromkeys(self.dtypes.values()):
+            idx = [
+                self.positions[feature_name(col)]
+                for col in self.columns
+                if self.dtypes[col] == dtype
+            ]
+            values = matrix[:, idx]
+            if dtype != "float32":
+                # Integer columns cannot hold NaN, so missing values become 0
+                values = np.nan_to_num(values).astype(dtype)
+            blocks.append(
+                pd.DataFrame(
+                    values, index=data.index, columns=[self.columns[i] for i in idx]
+                )
+            )
+        return pd.concat(blocks, axis=1)[self.columns]
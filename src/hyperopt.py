@@ -8,8 +8,8 @@ import src.config as config
 
 def hyperopt():
     # Load and prepare data
-    data = load_data(config.DATA_PATH)
-    X = set_features(data, mode="drop")
+    data = load_data(config.DATA_PATH, mode="drop")
+    X = set_features(data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR)
     y = data["normalized_dms_score"]
     groups = data["gene_id"]
 
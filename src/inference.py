@@ -2,17 +2,23 @@ import os
 import numpy as np
 import pandas as pd
 import lightgbm as lgb
-from src.data_utils import set_features
+from src.data_utils import load_data
+from src.feature_encoder import FeatureEncoder
 from src.evaluation import evaluate_predictions
 import src.config as config
 
 
 def inference():
     # Load input data and pretrained model
-    data = pd.read_csv(config.INFERENCE_DATA_PATH)
+    data = load_data(config.INFERENCE_DATA_PATH, mode="drop")
     model = lgb.Booster(model_file=config.MODEL_PATH)
+    if os.path.exists(config.ENCODER_PATH):
+        encoder = FeatureEncoder.load(config.ENCODER_PATH)
+    else:
+        encoder = FeatureEncoder.from_feature_names(model.feature_name())
 
-    X = set_features(data, mode="drop")
+    # Encode into the exact feature layout the model was trained on
+    X = encoder.transform(data, embedding_store=config.INFERENCE_EMBEDDING_STORE_DIR)
     y = data["normalized_dms_score"]
 
     for gene_id in data["gene_id"].unique():
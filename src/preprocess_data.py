@@ -1,9 +1,206 @@
-from src.data_utils import fetch_data, preprocess
+import os
+import glob
+import json
+import pandas as pd
+from src.data_utils import (
+    RAW_EMBEDDING_PREFIXES,
+    load_data,
+    concat_processed,
+    fetch_data,
+    fetch_fingerprints,
+    build_pair_tensor,
+    stream_data,
+    list_shards,
+    preprocess_by_gene,
+    save_data,
+    write_embedding_store,
+    write_position_store,
+    save_gene_partitions,
+    drop_gene_partitions,
+    dtype_memory_report,
+)
 import src.config as config
 
 
+def clear_outputs(paths):
+    for path in paths:
+        os.remove(path)
+
+
+def save_memory_report(report):
+    report.to_csv(os.path.join(config.OUTPUT_DIR, "dtype_memory_report.csv"))
+
+
+def store_position_embeddings(gene_ids, part=0, store_dir=config.EMBEDDING_STORE_DIR):
+    # Wild-type embeddings are fetched once per (gene_id, position), not per mutation
+    positions = fetch_data(
+        config.POSITION_QUERY_PATH,
+        config.DB_URL,
+        gene_ids,
+        config.EXTRACT_N_JOBS,
+        config.EXTRACT_GENES_PER_QUERY,
+    )
+    write_position_store(positions, store_dir, part)
+
+
+def save_raw(data, append=False):
+    # Embeddings are kept in the embedding store rather than in the raw CSV
+    data.drop(columns=list(RAW_EMBEDDING_PREFIXES), errors="ignore").to_csv(
+        config.RAW_DATA_PATH,
+        mode="a" if append else "w",
+        header=not append,
+        index=False,
+    )
+
+
 def preprocess_data():
-    data = fetch_data(config.QUERY_PATH, config.DB_URL)
-    data.to_csv(config.RAW_DATA_PATH, index=False)
-    data = preprocess(data)
-    data.to_csv(config.PROCESSED_DATA_PATH, index=False)
+    # Residue-pair features are looked up from one small table built per run
+    pair_tensor = build_pair_tensor(fetch_data(config.PAIR_QUERY_PATH, config.DB_URL))
+
+    if config.INFERENCE_GENE_IDS:
+        preprocess_inference_data(pair_tensor)
+
+    if config.INCREMENTAL_PREPROCESSING:
+        preprocess_data_incremental(pair_tensor)
+        return
+
+    # Remove the embedding store and gene partitions of a previous run
+    clear_outputs(glob.glob(os.path.join(config.EMBEDDING_STORE_DIR, "*.npy")))
+    clear_outputs(glob.glob(os.path.join(config.GENE_PARTITIONS_DIR, "*")))
+
+    if config.EXTRACT_BATCH_SIZE:
+        preprocess_data_streaming(pair_tensor)
+        return
+
+    data = fetch_data(
+        config.QUERY_PATH,
+        config.DB_URL,
+        config.GENE_IDS,
+        config.EXTRACT_N_JOBS,
+        config.EXTRACT_GENES_PER_QUERY,
+    )
+    save_raw(data)
+    data = preprocess_by_gene(data, pair_tensor, config.PREPROCESS_N_JOBS)
+    save_memory_report(dtype_memory_report(data))
+    data = write_embedding_store(data, config.EMBEDDING_STORE_DIR)
+    store_position_embeddings(data["gene_id"].unique())
+    save_data(data, config.PROCESSED_DATA_PATH)
+    if config.PARTITION_BY_GENE:
+        save_gene_partitions(data, config.GENE_PARTITIONS_DIR)
+
+
+def preprocess_inference_data(pair_tensor):
+    # Held-out genes get their own dataset and embedding store for inference
+    clear_outputs(
+        glob.glob(os.path.join(config.INFERENCE_EMBEDDING_STORE_DIR, "*.npy"))
+    )
+    data = fetch_data(
+        config.QUERY_PATH,
+        config.DB_URL,
+        config.INFERENCE_GENE_IDS,
+        config.EXTRACT_N_JOBS,
+        config.EXTRACT_GENES_PER_QUERY,
+    )
+    data = preprocess_by_gene(data, pair_tensor, config.PREPROCESS_N_JOBS)
+    data = write_embedding_store(data, config.INFERENCE_EMBEDDING_STORE_DIR)
+    store_position_embeddings(
+        config.INFERENCE_GENE_IDS, store_dir=config.INFERENCE_EMBEDDING_STORE_DIR
+    )
+    save_data(data, config.INFERENCE_DATA_PATH)
+
+
+def preprocess_data_streaming(pair_tensor):
+    # Clear shards left over from a previous run
+    os.makedirs(config.PROCESSED_SHARDS_DIR, exist_ok=True)
+    clear_outputs(list_shards(config.PROCESSED_SHARDS_DIR))
+
+    reports = []
+    batches = stream_data(
+        config.QUERY_PATH, config.DB_URL, config.GENE_IDS, config.EXTRACT_BATCH_SIZE
+    )
+    for i, batch in enumerate(batches):
+        save_raw(batch, append=i > 0)
+        data = preprocess_by_gene(batch, pair_tensor, config.PREPROCESS_N_JOBS)
+        reports.append(dtype_memory_report(data))
+        data = write_embedding_store(data, config.EMBEDDING_STORE_DIR, i)
+        store_position_embeddings(data["gene_id"].unique(), i)
+        shard_path = os.path.join(config.PROCESSED_SHARDS_DIR, f"part-{i:05d}.parquet")
+        save_data(data, shard_path)
+        if config.PARTITION_BY_GENE:
+            save_gene_partitions(data, config.GENE_PARTITIONS_DIR)
+
+    if reports:
+        report = pd.concat(reports).groupby(level=0)
+        save_memory_report(
+            report.agg(
+                {
+                    "n_columns": "max",
+                    "bytes_64bit": "sum",
+                    "bytes": "sum",
+                    "saved_mb": "sum",
+                }
+            )
+        )
+
+
+def preprocess_data_incremental(pair_tensor):
+    # Fingerprints need the raw scores, which the SQL score summaries leave out
+    fingerprints = fetch_fingerprints(
+        config.BASE_QUERY_PATH,
+        config.DB_URL,
+        config.GENE_IDS,
+        config.EXTRACT_N_JOBS,
+        config.EXTRACT_GENES_PER_QUERY,
+    )
+
+    # Fingerprints of the genes already in the processed dataset
+    previous = {}
+    if os.path.exists(config.FINGERPRINTS_PATH) and os.path.exists(
+        config.PROCESSED_DATA_PATH
+    ):
+        with open(config.FINGERPRINTS_PATH, "r") as f:
+            previous = {int(gene_id): fp for gene_id, fp in json.load(f).items()}
+
+    changed = [
+        gene_id for gene_id, fp in fingerprints.items() if previous.get(gene_id) != fp
+    ]
+    stale = set(changed) | (set(previous) - set(fingerprints))
+    if not stale:
+        return
+
+    frames = []
+    if previous:
+        data = load_data(config.PROCESSED_DATA_PATH)
+        frames.append(data[~data["gene_id"].isin(stale)])
+        if config.PARTITION_BY_GENE:
+            drop_gene_partitions(config.GENE_PARTITIONS_DIR, set(previous) & stale)
+    else:
+        # Start a fresh embedding store and partitions alongside the fresh dataset
+        clear_outputs(glob.glob(os.path.join(config.EMBEDDING_STORE_DIR, "*.npy")))
+        clear_outputs(glob.glob(os.path.join(config.GENE_PARTITIONS_DIR, "*")))
+
+    if changed:
+        # New store parts take precedence over rows of earlier parts
+        part = len(
+            glob.glob(os.path.join(config.EMBEDDING_STORE_DIR, "embeddings-*.npy"))
+        )
+        data = fetch_data(
+            config.QUERY_PATH,
+            config.DB_URL,
+            changed,
+            config.EXTRACT_N_JOBS,
+            config.EXTRACT_GENES_PER_QUERY,
+        )
+        # Appended rows of re-extracted genes follow their earlier raw rows
+        save_raw(data, append=bool(previous) and os.path.exists(config.RAW_DATA_PATH))
+        data = preprocess_by_gene(data, pair_tensor, config.PREPROCESS_N_JOBS)
+        save_memory_report(dtype_memory_report(data))
+        data = write_embedding_store(data, config.EMBEDDING_STORE_DIR, part)
+        store_position_embeddings(changed, part)
+        if config.PARTITION_BY_GENE:
+            save_gene_partitions(data, config.GENE_PARTITIONS_DIR)
+        frames.append(data)
+
+    save_data(concat_processed(frames), config.PROCESSED_DATA_PATH)
+    with open(config.FINGERPRINTS_PATH, "w") as f:
+        json.dump(fingerprints, f)
@@ -3,14 +3,15 @@ import pandas as pd
 from sklearn.model_selection import GroupShuffleSplit
 from src.data_utils import load_data, set_features
 from src.model_utils import train_lightgbm
+from src.feature_encoder import FeatureEncoder
 from src.evaluation import evaluate_predictions, collect_predictions
 import src.config as config
 
 
 def train():
     # Load and prepare data
-    data = load_data(config.DATA_PATH)
-    X = set_features(data, mode="drop")
+    data = load_data(config.DATA_PATH, mode="drop")
+    X = set_features(data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR)
     y = data["normalized_dms_score"]
     groups = data["gene_id"]
 
@@ -28,8 +29,9 @@ def train():
     test_metrics = evaluate_predictions(y_test, model.predict(X_test))
     results = [collect_predictions(train_metrics, test_metrics, X_train, X_test)]
 
-    # Save model
+    # Save model and the feature layout it was trained on
     model.save_model(config.MODEL_PATH)
+    FeatureEncoder.fit(X_train).save(config.ENCODER_PATH)
 
     # Save evaluation results
     results_df = pd.DataFrame(results)
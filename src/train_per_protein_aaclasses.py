@@ -2,7 +2,7 @@ import os
 import json
 import pandas as pd
 import lightgbm as lgb
-from src.data_utils import load_data, set_features
+from src.data_utils import iter_genes, set_features
 from src.evaluation import evaluate_predictions, collect_predictions
 import src.config as config
 
@@ -11,13 +11,14 @@ def train_per_protein_substitution_classes():
     # Allowed amino-acid substitution classes
     allowed_variants = {"H", "E", "N", "I", "G"}
 
-    # Load data
-    data = load_data(config.DATA_PATH_DOMAINOME)
-
-    if "variant_residue" not in data.columns:
-        raise ValueError("Dataset must contain column 'variant_residue'")
-
-    gene_ids = data["gene_id"].unique()
+    # Variant residues come from the raw extract, as preprocessing drops them
+    variant_residues = (
+        pd.read_csv(
+            config.RAW_DATA_PATH, usecols=["mutation_id", "variant_residue"]
+        )
+        .drop_duplicates("mutation_id")
+        .set_index("mutation_id")["variant_residue"]
+    )
 
     # Load tuned LightGBM parameters
     with open(config.BEST_PARAMS_PATH, "r") as f:
@@ -45,23 +46,25 @@ def train_per_protein_substitution_classes():
 
     results = []
 
-    for gene_id in gene_ids:
-        gene_data = data[data["gene_id"] == gene_id]
-
-        train_data = gene_data[
-            gene_data["variant_residue"].isin(allowed_variants)
-        ]
+    genes = iter_genes(config.PER_PROTEIN_DATA_PATH, mode="drop")
+    for gene_id, gene_data in genes:
+        variant_residue = gene_data["mutation_id"].map(variant_residues)
+        train_data = gene_data[variant_residue.isin(allowed_variants)]
         test_data = gene_data[
-            ~gene_data["variant_residue"].isin(allowed_variants)
+            variant_residue.notna() & ~variant_residue.isin(allowed_variants)
         ]
 
         if train_data.empty or test_data.empty:
             continue
 
         # Extract features and targets
-        X_train = set_features(train_data, mode="drop")
+        X_train = set_features(
+            train_data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR
+        )
         y_train = train_data["normalized_dms_score"]
-        X_test = set_features(test_data, mode="drop")
+        X_test = set_features(
+            test_data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR
+        )
         y_test = test_data["normalized_dms_score"]
 
         # Train model
@@ -1,16 +1,12 @@
 import os
 import pandas as pd
 import lightgbm as lgb
-from src.data_utils import load_data, set_features
+from src.data_utils import iter_genes, set_features
 from src.evaluation import evaluate_predictions, collect_predictions
 import src.config as config
 
 
 def train_per_protein_lnsnvo():
-    # Load and prepare data
-    data = load_data(config.DATA_PATH)
-    gene_ids = data["gene_id"].unique()
-
     # Use fixed/default LightGBM parameters directly
     best_params = {
         "boosting_type": "gbdt",
@@ -30,9 +26,9 @@ def train_per_protein_lnsnvo():
 
     results = []
 
-    for gene_id in gene_ids:
-        gene_data = data[data["gene_id"] == gene_id]
-
+    # Load and prepare data one gene at a time
+    genes = iter_genes(config.PER_PROTEIN_DATA_PATH, mode="drop")
+    for gene_id, gene_data in genes:
         train_data = gene_data[gene_data["edit_distance"] == 1]  # SNVs
         test_data = gene_data[gene_data["edit_distance"] != 1]  # non-SNVs
 
@@ -40,9 +36,13 @@ def train_per_protein_lnsnvo():
             continue
 
         # Extract features and targets
-        X_train = set_features(train_data, mode="drop")
+        X_train = set_features(
+            train_data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR
+        )
         y_train = train_data["normalized_dms_score"]
-        X_test = set_features(test_data, mode="drop")
+        X_test = set_features(
+            test_data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR
+        )
         y_test = test_data["normalized_dms_score"]
 
         # Train model
@@ -1,6 +1,6 @@
 import os
 import pandas as pd
-from src.data_utils import load_data, set_features
+from src.data_utils import iter_genes, set_features
 from src.evaluation import (
     evaluate_predictions,
     collect_predictions,
@@ -11,10 +11,6 @@ import src.config as config
 
 
 def train_per_protein_loposo():
-    # Load and prepare data
-    data = load_data(config.DATA_PATH)
-    gene_ids = data["gene_id"].unique()
-
     # Set up directory for saving models
     model_dir = os.path.join(
         os.path.dirname(config.MODEL_PATH), "per_protein_loposo_models"
@@ -24,8 +20,9 @@ def train_per_protein_loposo():
         model_dir, "lgbm_model_gene_{gene_id}_excluding_pos_{position}.pkl"
     )
 
-    for gene_id in gene_ids:
-        gene_data = data[data["gene_id"] == gene_id]
+    # Load and prepare data one gene at a time
+    genes = iter_genes(config.PER_PROTEIN_DATA_PATH, mode="drop")
+    for gene_id, gene_data in genes:
         unique_positions = gene_data["position"].unique()
 
         # Skip genes with too few positions
@@ -44,9 +41,13 @@ def train_per_protein_loposo():
                 continue
 
             # Extract features and targets
-            X_train = set_features(train_data, mode="drop")
+            X_train = set_features(
+                train_data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR
+            )
             y_train = train_data["normalized_dms_score"]
-            X_test = set_features(test_data, mode="drop")
+            X_test = set_features(
+                test_data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR
+            )
             y_test = test_data["normalized_dms_score"]
 
             # Train model
@@ -1,16 +1,13 @@
 import os
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from src.data_utils import load_data, set_features
+from src.data_utils import iter_genes, set_features
 from src.evaluation import evaluate_predictions, collect_predictions
 from src.model_utils import train_lightgbm
 import src.config as config
 
 
 def train_per_protein_lposo():
-    # Load and prepare data
-    data = load_data(config.DATA_PATH)
-    gene_ids = data["gene_id"].unique()
     results = []
 
     # Set up directory for saving models
@@ -20,9 +17,9 @@ def train_per_protein_lposo():
     os.makedirs(model_dir, exist_ok=True)
     model_template = os.path.join(model_dir, "lgbm_model_{gene_id}.pkl")
 
-    for gene_id in gene_ids:
-        gene_data = data[data["gene_id"] == gene_id]
-
+    # Load and prepare data one gene at a time
+    genes = iter_genes(config.PER_PROTEIN_DATA_PATH, mode="drop")
+    for gene_id, gene_data in genes:
         # Stratified split by position
         unique_positions = gene_data["position"].unique()
         if len(unique_positions) < 2:
@@ -39,8 +36,12 @@ def train_per_protein_lposo():
             continue
 
         # Extract features and targets
-        X_train = set_features(train_data, mode="drop")
-        X_test = set_features(test_data, mode="drop")
+        X_train = set_features(
+            train_data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR
+        )
+        X_test = set_features(
+            test_data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR
+        )
         y_train = train_data["normalized_dms_score"]
         y_test = test_data["normalized_dms_score"]
 
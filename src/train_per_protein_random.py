@@ -1,17 +1,13 @@
 import os
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from src.data_utils import load_data, set_features
+from src.data_utils import iter_genes, set_features
 from src.evaluation import evaluate_predictions, collect_predictions
 from src.model_utils import train_lightgbm
 import src.config as config
 
 
 def train_per_protein_random():
-    # Load and prepare data
-    data = load_data(config.DATA_PATH)
-    gene_ids = data["gene_id"].unique()
-
     results = []
 
     # Set up directory for saving models
@@ -21,14 +17,16 @@ def train_per_protein_random():
     os.makedirs(model_dir, exist_ok=True)
     model_template = os.path.join(model_dir, "lgbm_model_{gene_id}.pkl")
 
-    for gene_id in gene_ids:
-        gene_data = data[data["gene_id"] == gene_id]
-
+    # Load and prepare data one gene at a time
+    genes = iter_genes(config.PER_PROTEIN_DATA_PATH, mode="drop")
+    for gene_id, gene_data in genes:
         if gene_data.shape[0] < 2:
             continue
 
         # Extract features and targets
-        X = set_features(gene_data, mode="drop")
+        X = set_features(
+            gene_data, mode="drop", embedding_store=config.EMBEDDING_STORE_DIR
+        )
         y = gene_data["normalized_dms_score"]
 
         # Random 80/20 train-test split